@@ -0,0 +1,103 @@
+# Modes that use the accelerometer. ModeSwitcher only imports this when one
+# of them is picked, so the other modes don't pay for it.
+
+import random
+
+from fixedpoint import ONE
+
+# Brightness along the arm for AccelPlumb, from the centre out
+_PLUMB = bytes((100, 120, 120, 160, 180, 180, 220, 255))
+
+class AccelPlumb:
+    def __init__(self, display, accel):
+        self.display = display
+        self.accel = accel
+        self.delay = 0.004
+
+    def start(self):
+        self.display.set_all(0)
+
+    def draw(self):
+        self.display.subtract_all(4)
+
+        # The accelerometer works out which arm is pointing down, see
+        # Accelerometer in accelerometer.py
+        arm_index = self.accel.down_arm
+        if arm_index == -1:
+            return
+
+        # Light the arm pointing down, brighter at the tip
+        frame = self.display.frame
+        arm = self.display.ARMS[arm_index].indexes
+        for position in range(8):
+            frame[arm[position]] = _PLUMB[position]
+
+class AccelActivity:
+    def __init__(self, display, accel):
+        self.__display = display
+        self.__accel = accel
+        self.__updates = accel.updates
+        self.delay = 0.010
+
+        self.__accumulator = 0
+
+    def start(self):
+        self.__display.set_all(0)
+
+    def draw(self):
+        # Only count each batch of readings once, however many frames it lasts
+        if self.__accel.updates != self.__updates:
+            self.__updates = self.__accel.updates
+            self.__accumulator += self.__accel.jerk
+
+        # The accumulator is in Q8.8 fixed point, like accel.jerk
+        self.__display.subtract_all(1)
+        frame = self.__display.frame
+        for foo in (16, 8, 4, 2, 1):
+            if self.__accumulator > foo * ONE:
+                self.__accumulator -= foo * ONE
+                i = random.randint(0, 47)
+                frame[i] = min(255, frame[i] + foo * 16)
+
+# A marble that rolls around the snowflake as you tilt it
+class AccelMarble:
+    def __init__(self, display, accel):
+        self.display = display
+        self.accel = accel
+        self.delay = 0.004
+
+        # Position and velocity in 1/256ths of Display's geometry units
+        self.x = 0
+        self.y = 0
+        self.vx = 0
+        self.vy = 0
+
+    def start(self):
+        self.display.set_all(0)
+
+    def draw(self):
+        self.display.subtract_all(4)
+
+        # Gravity on the display has x pointing right, which is -X on the sensor
+        gravity = self.accel.gravity
+        self.vx += -gravity[0] >> 10
+        self.vy += gravity[1] >> 10
+        # Friction
+        self.vx -= self.vx >> 4
+        self.vy -= self.vy >> 4
+
+        x = self.x + self.vx
+        y = self.y + self.vy
+        # Bounce off the edge, losing half the speed
+        if x * x + y * y > (50 * 256) * (50 * 256):
+            self.vx = -self.vx >> 1
+            self.vy = -self.vy >> 1
+        else:
+            self.x = x
+            self.y = y
+
+        frame = self.display.frame
+        frame[self.display.nearest_led(self.x >> 8, self.y >> 8)] = 255
+        second = self.display.nearest_led(self.x >> 8, self.y >> 8, 1)
+        if frame[second] < 96:
+            frame[second] = 96
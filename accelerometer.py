@@ -1,9 +1,242 @@
 import adafruit_lis3dh
 import board
+from array import array
 from digitalio import DigitalInOut
 
+from display import ARM_BY_ANGLE, angle_bin
+from fixedpoint import atan2, isqrt
+
+# LIS3DH registers used for the FIFO and the motion interrupt, from the
+# datasheet
+_REG_CTRL2 = 0x21
+_REG_CTRL3 = 0x22
+_REG_CTRL5 = 0x24
+_REG_REFERENCE = 0x26
+_REG_FIFO_CTRL = 0x2E
+_REG_FIFO_SRC = 0x2F
+_REG_OUT_X_L = 0x28
+_REG_INT1_CFG = 0x30
+_REG_INT1_SRC = 0x31
+_REG_INT1_THS = 0x32
+_REG_INT1_DURATION = 0x33
+
+_CTRL2_HP_IA1 = 0x01
+_CTRL3_I1_IA1 = 0x40
+_CTRL3_I1_WTM = 0x04
+# Any of X, Y or Z above the threshold
+_INT1_CFG_HIGH = 0x2A
+_CTRL5_FIFO_EN = 0x40
+_CTRL5_LIR_INT1 = 0x08
+_FIFO_CTRL_STREAM = 0x80
+_FIFO_SRC_OVRN = 0x40
+_FIFO_SRC_FSS = 0x1F
+# Setting the top bit of the register address makes the LIS3DH step through
+# the registers, so we can read many samples in one I2C transaction
+_AUTO_INCREMENT = 0x80
+
+FIFO_DEPTH = 32
+
+# How many samples we keep, oldest first from head
+HISTORY = 64
+
+# The filtered value moves 1/2^FILTER_SHIFT of the way to each new sample
+FILTER_SHIFT = 3
+
+# If gravity in the display plane is weaker than this (in raw counts) the
+# snowflake is lying flat and no arm points down
+FLAT_THRESHOLD = 2000
+
+# Counts per g for each range, as used by adafruit_lis3dh
+_DIVIDERS = {
+    adafruit_lis3dh.RANGE_2_G: 16380,
+    adafruit_lis3dh.RANGE_4_G: 8190,
+    adafruit_lis3dh.RANGE_8_G: 4096,
+    adafruit_lis3dh.RANGE_16_G: 1365,
+}
+
 class Accelerometer:
-    def __init__(self):
+    # The LIS3DH collects samples in its own FIFO and raises INT1 once
+    # watermark samples are waiting. update() is called between frames and
+    # only touches the I2C bus when that happens, reading the whole batch in
+    # one go. Modes read the cached results, so drawing never waits on I2C.
+    #
+    # Readings are kept in raw sensor counts; scale converts them to m/s^2.
+    #
+    # After each batch it also works out the orientation once for every mode:
+    # * gravity: the low-pass filtered reading (the same array as filtered)
+    # * tilt: the direction of down in the display plane, in degrees
+    #   clockwise from the top
+    # * down_arm: index into Display.ARMS of the arm pointing down, or -1 if
+    #   the snowflake is lying flat
+    # * jerk: how far the reading moved since the previous batch, in m/s^2
+    #   as Q8.8 fixed point (see fixedpoint.py)
+    # * updates: counts batches, so modes can tell when these have changed
+    #
+    # While the snowflake sleeps, watch_motion() switches INT1 over to go high
+    # when it's moved, so it can wake up, and watch_fifo() switches it back.
+    #
+    # ready can be set to an asyncio Event (see async_runtime.py), which is
+    # set after every batch, so an async mode can wait for new readings with
+    # await accel.next_batch(). Nothing clears it again, so waiting on ready
+    # directly only waits the first time.
+    def __init__(self, watermark=4):
         self.i2c = board.I2C()
         self.int1 = DigitalInOut(board.INT1)
         self.lis3dh = adafruit_lis3dh.LIS3DH_I2C(self.i2c, int1=self.int1, address=0x19)
+
+        self.scale = adafruit_lis3dh.STANDARD_GRAVITY / _DIVIDERS[self.lis3dh.range]
+        # The same, in Q16.16, to work out jerk without floats
+        self.__scale_q16 = int(self.scale * 65536)
+
+        self.samples = array('h', [0] * (HISTORY * 3))
+        self.head = 0
+        # Total samples read since power on, so a mode can tell if there are new ones
+        self.count = 0
+        # How many times the FIFO filled up before we read it
+        self.overruns = 0
+        self.filtered = array('h', [0] * 3)
+        self.gravity = self.filtered
+
+        self.tilt = 0
+        self.down_arm = -1
+        self.jerk = 0
+        self.updates = 0
+        self.ready = None
+        self.__previous = array('h', [0] * 3)
+
+        self.__command = bytes((_REG_OUT_X_L | _AUTO_INCREMENT,))
+        self.__burst = bytearray(FIFO_DEPTH * 6)
+
+        # Start with one direct reading, so there's something to show before
+        # the first batch arrives
+        x, y, z = self.lis3dh.acceleration
+        self.__store(int(x / self.scale), int(y / self.scale), int(z / self.scale))
+        for axis in range(3):
+            self.filtered[axis] = self.samples[axis]
+            self.__previous[axis] = self.samples[axis]
+        self.__orient()
+
+        self.lis3dh._write_register_byte(_REG_CTRL5, _CTRL5_FIFO_EN | _CTRL5_LIR_INT1)
+        self.lis3dh._write_register_byte(_REG_FIFO_CTRL, _FIFO_CTRL_STREAM | watermark)
+        self.lis3dh._write_register_byte(_REG_CTRL3, _CTRL3_I1_WTM)
+
+    def __store(self, x, y, z):
+        i = self.head * 3
+        samples = self.samples
+        samples[i] = x
+        samples[i + 1] = y
+        samples[i + 2] = z
+        self.head = (self.head + 1) % HISTORY
+        self.count += 1
+
+    def update(self):
+        # Cheap enough to call every few milliseconds. Returns how many new
+        # samples were read.
+        if not self.int1.value:
+            return 0
+        return self.drain()
+
+    def drain(self):
+        status = self.lis3dh._read_register_byte(_REG_FIFO_SRC)
+        available = status & _FIFO_SRC_FSS
+        if status & _FIFO_SRC_OVRN:
+            self.overruns += 1
+            available = FIFO_DEPTH
+        if available == 0:
+            return 0
+
+        burst = self.__burst
+        with self.lis3dh._i2c as i2c:
+            i2c.write_then_readinto(self.__command, burst, in_end=available * 6)
+
+        filtered = self.filtered
+        samples = self.samples
+        for n in range(available):
+            i = self.head * 3
+            for axis in range(3):
+                j = n * 6 + axis * 2
+                value = burst[j] | (burst[j + 1] << 8)
+                if value & 0x8000:
+                    value -= 0x10000
+                samples[i + axis] = value
+                filtered[axis] += (value - filtered[axis]) >> FILTER_SHIFT
+            self.head = (self.head + 1) % HISTORY
+        self.count += available
+        self.__orient()
+        if self.ready is not None:
+            self.ready.set()
+        return available
+
+    async def next_batch(self):
+        # Waits for the next batch of readings, from a draw_async()
+        self.ready.clear()
+        await self.ready.wait()
+
+    def watch_motion(self, threshold=8):
+        # INT1 goes high once any axis moves more than threshold steps of
+        # 16 mg (at the 2 g range) instead of when the FIFO fills. Lets go of
+        # the pin and returns it, for alarm.pin.PinAlarm.
+        lis3dh = self.lis3dh
+        lis3dh._write_register_byte(_REG_CTRL3, 0)
+        # The high-pass filter takes gravity out, so only movement counts
+        lis3dh._write_register_byte(_REG_CTRL2, _CTRL2_HP_IA1)
+        lis3dh._write_register_byte(_REG_INT1_THS, threshold)
+        lis3dh._write_register_byte(_REG_INT1_DURATION, 0)
+        lis3dh._write_register_byte(_REG_INT1_CFG, _INT1_CFG_HIGH)
+        # Reading REFERENCE starts the filter from the current reading, and
+        # reading INT1_SRC clears anything already latched
+        lis3dh._read_register_byte(_REG_REFERENCE)
+        lis3dh._read_register_byte(_REG_INT1_SRC)
+        lis3dh._write_register_byte(_REG_CTRL3, _CTRL3_I1_IA1)
+        self.int1.deinit()
+        return board.INT1
+
+    def watch_fifo(self):
+        # Undoes watch_motion()
+        lis3dh = self.lis3dh
+        lis3dh._write_register_byte(_REG_CTRL3, 0)
+        lis3dh._write_register_byte(_REG_INT1_CFG, 0)
+        lis3dh._write_register_byte(_REG_CTRL2, 0)
+        lis3dh._read_register_byte(_REG_INT1_SRC)
+        self.int1 = DigitalInOut(board.INT1)
+        lis3dh._write_register_byte(_REG_CTRL3, _CTRL3_I1_WTM)
+        # The FIFO overflowed while we slept, so catch up on the latest
+        # samples now
+        self.drain()
+
+    def __orient(self):
+        previous = self.__previous
+        dx = self.latest(0) - previous[0]
+        dy = self.latest(1) - previous[1]
+        dz = self.latest(2) - previous[2]
+        self.jerk = (isqrt(dx * dx + dy * dy + dz * dz) * self.__scale_q16) >> 8
+        for axis in range(3):
+            previous[axis] = self.latest(axis)
+
+        gx = self.gravity[0]
+        gy = self.gravity[1]
+        if abs(gx) + abs(gy) < FLAT_THRESHOLD:
+            self.down_arm = -1
+        else:
+            # The sensor reads +Y when the bottom of the snowflake points down
+            # and +X when the left side does, so down on the display is
+            # (-gx, gy) with y pointing down
+            self.tilt = atan2(-gx, -gy)
+            self.down_arm = ARM_BY_ANGLE[angle_bin(self.tilt)]
+        self.updates += 1
+
+    def latest(self, axis):
+        # Most recent reading on one axis (0 = x, 1 = y, 2 = z), in raw counts
+        return self.samples[((self.head - 1) % HISTORY) * 3 + axis]
+
+    @property
+    def acceleration(self):
+        # Most recent reading in m/s^2, like adafruit_lis3dh's acceleration
+        scale = self.scale
+        return (self.latest(0) * scale, self.latest(1) * scale, self.latest(2) * scale)
+
+    @property
+    def filtered_acceleration(self):
+        scale = self.scale
+        filtered = self.filtered
+        return (filtered[0] * scale, filtered[1] * scale, filtered[2] * scale)
@@ -0,0 +1,94 @@
+# Runs the snowflake as asyncio tasks instead of code.py's single loop.
+#
+# Drawing is one task, and everything else (buttons, accelerometer, saving
+# settings, the serial console) is a task of its own, called every so often.
+# They only take turns when one of them awaits, so a task never interrupts
+# a frame halfway through, but a slow one can no longer hold up the others
+# for longer than it takes to run once.
+#
+# Modes work the same as with the other runtime. A mode can also have an
+# async draw_async(), which is awaited instead of draw(), so it can wait for
+# something (like accel.next_batch()) without stopping the other tasks.
+#
+# asyncio isn't built into the firmware. It and adafruit_ticks come from the
+# CircuitPython library bundle, and need copying into CIRCUITPY/lib.
+
+import asyncio
+
+from scheduler import FrameScheduler
+
+class AsyncRuntime:
+    def __init__(self, display, mode_switcher, telemetry, governor, sleeper=None, **scheduler_args):
+        self.display = display
+        self.mode_switcher = mode_switcher
+        self.telemetry = telemetry
+        self.governor = governor
+        # Optional, see sleeper.py
+        self.sleeper = sleeper
+        # Keeps the frame timetable and garbage collection the same as the
+        # other runtime. Input is handled by tasks here, not by its poll.
+        self.scheduler = FrameScheduler(None, **scheduler_args)
+        self.__tasks = []
+
+    def every(self, period, function):
+        # Call function every period seconds, from its own task
+        self.__tasks.append((int(period * 1000), function))
+
+    def event(self):
+        return asyncio.Event()
+
+    async def __repeat(self, period_ms, function):
+        while True:
+            function()
+            await asyncio.sleep_ms(period_ms)
+
+    async def __render(self):
+        scheduler = self.scheduler
+        telemetry = self.telemetry
+        display = self.display
+        governor = self.governor
+        mode = None
+        draw_async = None
+        static = False
+        while True:
+            current_mode = self.mode_switcher.get_current_mode()
+            if current_mode is not mode:
+                mode = current_mode
+                draw_async = getattr(mode, 'draw_async', None)
+                static = self.sleeper is not None and getattr(mode, 'static', False)
+
+            display.dt_us = scheduler.frame_ns // 1000
+            if draw_async is not None:
+                await draw_async()
+            else:
+                mode.draw()
+            changed = display.present()
+
+            delay = governor.update(mode, scheduler.busy_ns)
+            slack = scheduler.end_frame(delay)
+
+            # Let the other tasks run until the next frame is due. sleep_ms()
+            # only has millisecond resolution, so the last bit is spent
+            # yielding with sleep_ms(0).
+            while True:
+                remaining = scheduler.deadline - scheduler.now()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep_ms(remaining // 1000000)
+            scheduler.start_frame()
+            telemetry.record(mode, scheduler.busy_ns, slack, scheduler.frame_ns)
+
+            if static and not changed:
+                # The other tasks only look after input, and there won't be
+                # any until the sleeper wakes up, so it's fine to block them
+                self.sleeper.until_input(telemetry.poll_serial)
+                scheduler.resume()
+
+    async def __main(self):
+        tasks = [asyncio.create_task(self.__render())]
+        for period_ms, function in self.__tasks:
+            tasks.append(asyncio.create_task(self.__repeat(period_ms, function)))
+        await asyncio.gather(*tasks)
+
+    def run(self):
+        asyncio.run(self.__main())
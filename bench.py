@@ -0,0 +1,135 @@
+# Measures how much each mode costs per frame.
+#
+# On the snowflake, run it from the serial console:
+#
+#     >>> import bench
+#     >>> bench.main()
+#
+# On a computer, sim/run_bench.py runs it in the simulator and compares the
+# results with sim/bench_baseline.json.
+#
+# For every mode in ModeSwitcher it reports:
+# * time_ns: wall time for draw() plus present(), per frame (printed in
+#   microseconds). It's kept unrounded, since the fastest modes take well
+#   under a microsecond.
+# * set_led / get_led: calls into xmas3 per frame (only in the simulator)
+# * alloc: bytes allocated per frame. On the snowflake this comes from
+#   gc.mem_alloc(). In the simulator it is the peak from tracemalloc, which
+#   also counts ints above 256 that CircuitPython stores without allocating.
+
+import gc
+import time
+
+import xmas3
+
+from telemetry import mode_name
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+if hasattr(time, 'perf_counter_ns'):
+    _ticks_ns = time.perf_counter_ns
+else:
+    _ticks_ns = time.monotonic_ns
+
+def _calls():
+    calls = getattr(xmas3, 'calls', None)
+    if calls is None:
+        return 0, 0
+    return calls['set_led'], calls['get_led']
+
+def _alloc_per_frame(display, mode, frames):
+    total = 0
+    if tracemalloc is not None:
+        tracemalloc.start()
+        for _ in range(frames):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            mode.draw()
+            display.present()
+            total += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+    else:
+        for _ in range(frames):
+            gc.collect()
+            gc.disable()
+            before = gc.mem_alloc()
+            mode.draw()
+            display.present()
+            total += gc.mem_alloc() - before
+            gc.enable()
+    return total // frames
+
+def measure(display, mode, frames=200, warmup=20, repeats=5):
+    mode.start()
+    for _ in range(warmup):
+        mode.draw()
+        display.present()
+
+    # Take the fastest of several runs, so a hiccup on the computer (or a
+    # garbage collection on the snowflake) doesn't count against the mode
+    best = None
+    for _ in range(repeats):
+        gc.collect()
+        set_before, get_before = _calls()
+        start = _ticks_ns()
+        for _ in range(frames):
+            mode.draw()
+            display.present()
+        elapsed = _ticks_ns() - start
+        set_after, get_after = _calls()
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return {
+        'time_ns': best // frames,
+        'set_led': (set_after - set_before) // frames,
+        'get_led': (get_after - get_before) // frames,
+        'alloc': _alloc_per_frame(display, mode, frames),
+    }
+
+def calibrate(frames=5000, repeats=5):
+    # A fixed amount of work that doesn't depend on any of our code, timed
+    # the same way as the modes. Dividing by it makes times from different
+    # runs (or a busy computer) comparable. It runs for much longer than a
+    # mode does and isn't rounded, since any error in it scales every mode.
+    # Returns nanoseconds per frame of it.
+    buffer = bytearray(48)
+    best = None
+    for _ in range(repeats):
+        start = _ticks_ns()
+        for _ in range(frames):
+            for i in range(48):
+                buffer[i] = i
+        elapsed = _ticks_ns() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / frames
+
+def run(display, accel, frames=200):
+    from mode import ModeSwitcher, make_mode
+    switcher = ModeSwitcher(display, accel)
+    results = {}
+    for group_index, group in enumerate(switcher.modes):
+        for mode_index, entry in enumerate(group):
+            mode = make_mode(display, entry)
+            result = measure(display, mode, frames)
+            result['name'] = mode_name(mode)
+            result['delay_us'] = round(mode.delay * 1000000, 1)
+            results['{}.{}'.format(group_index, mode_index)] = result
+    return results
+
+def report(results):
+    print('mode  name                     delay_us   time_us  set_led  get_led   alloc')
+    for key in sorted(results, key=lambda k: [int(p) for p in k.split('.')]):
+        r = results[key]
+        print('{:5} {:24} {:9} {:9} {:8} {:8} {:7}{}'.format(
+            key, r['name'], r['delay_us'], round(r['time_ns'] / 1000, 1), r['set_led'], r['get_led'], r['alloc'],
+            '  OVERRUN' if r['time_ns'] > r['delay_us'] * 1000 else ''))
+
+def main(frames=200):
+    from display import Display
+    from accelerometer import Accelerometer
+    report(run(Display(0, 60), Accelerometer(), frames))
@@ -0,0 +1,8 @@
+# Runs once when the snowflake is switched on (not when code.py reloads).
+# Changes here only take effect after switching it off and on again.
+
+import usb_cdc
+
+# A second USB serial port next to the console, for streaming frames to
+# StreamMode (see stream.py)
+usb_cdc.enable(console=True, data=True)
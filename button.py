@@ -1,17 +1,146 @@
-from digitalio import DigitalInOut, Direction, Pull
+from array import array
 
-class Button:
-    def __init__(self, pin):
-        self.gpio = DigitalInOut(pin)
-        self.gpio.direction = Direction.INPUT
-        self.gpio.pull = Pull.UP
+import keypad
+import supervisor
 
-        self.state = False
+# Kinds of ButtonEvent
+PRESS = 1
+RELEASE = 2
+# Held down for long_press_ms. Sent while it's still held, after PRESS.
+LONG_PRESS = 3
+# Pressed again within double_press_ms of letting go. Sent after the second
+# PRESS.
+DOUBLE_PRESS = 4
 
-    def is_pressed(self):
-        old_state = self.state
-        # The button reads 0 when pressed, so invert it
-        self.state = not self.gpio.value
-        if not old_state and self.state:
+LONG_PRESS_MS = 800
+DOUBLE_PRESS_MS = 350
+
+# How many events can wait to be handled before the oldest are lost
+QUEUE_SIZE = 16
+
+# supervisor.ticks_ms() wraps around at 2^29, so differences are masked
+_TICKS_MASK = (1 << 29) - 1
+
+# What a key is doing, for Buttons
+_UP = 0
+_DOWN = 1
+_LONG = 2
+
+class ButtonEvent:
+    def __init__(self):
+        # Index into the pins given to Buttons
+        self.key = 0
+        self.kind = 0
+        # supervisor.ticks_ms() when it happened
+        self.timestamp = 0
+
+class Buttons:
+    # The keypad module scans the buttons in the background every interval
+    # seconds and debounces them, so a press is caught, with the time it
+    # happened, however long the current frame takes.
+    #
+    # Call update() often (between frames is fine) to collect what keypad
+    # saw, then get() to take events oldest first. get() returns the same
+    # ButtonEvent object each time, so nothing is allocated.
+    def __init__(self, pins, interval=0.02, long_press_ms=LONG_PRESS_MS, double_press_ms=DOUBLE_PRESS_MS):
+        self.__pins = pins
+        self.__interval = interval
+        self.start()
+        self.__raw = keypad.Event()
+        self.event = ButtonEvent()
+        self.long_press_ms = long_press_ms
+        self.double_press_ms = double_press_ms
+        # Events lost because nobody was calling get()
+        self.dropped = 0
+
+        self.__kinds = bytearray(QUEUE_SIZE)
+        self.__keys = bytearray(QUEUE_SIZE)
+        self.__times = array('L', [0] * QUEUE_SIZE)
+        self.__head = 0
+        self.__length = 0
+
+        count = len(pins)
+        self.__state = bytearray(count)
+        self.__pressed_at = array('L', [0] * count)
+        self.__released_at = array('L', [0] * count)
+        # Whether the next press can count as a double press
+        self.__armed = bytearray(count)
+        # Whether the key is down for the second press of a double press
+        self.__second = bytearray(count)
+
+    def start(self):
+        # The buttons connect the pins to ground
+        self.keys = keypad.Keys(self.__pins, value_when_pressed=False, pull=True, interval=self.__interval)
+        self.__events = self.keys.events
+
+    def stop(self):
+        # Lets go of the pins, so they can wake the snowflake from sleep (see
+        # sleeper.py). Call start() to carry on. A key that's down when
+        # start() is called counts as a new press.
+        self.keys.deinit()
+
+    def busy(self):
+        # Whether a key is down or events are waiting for get()
+        if self.__length:
             return True
+        for state in self.__state:
+            if state != _UP:
+                return True
         return False
+
+    def __push(self, kind, key, timestamp):
+        if self.__length == QUEUE_SIZE:
+            # Lose the oldest
+            self.__head = (self.__head + 1) % QUEUE_SIZE
+            self.__length -= 1
+            self.dropped += 1
+        i = (self.__head + self.__length) % QUEUE_SIZE
+        self.__kinds[i] = kind
+        self.__keys[i] = key
+        self.__times[i] = timestamp
+        self.__length += 1
+
+    def update(self):
+        raw = self.__raw
+        state = self.__state
+        while self.__events.get_into(raw):
+            key = raw.key_number
+            timestamp = raw.timestamp
+            if raw.pressed:
+                self.__push(PRESS, key, timestamp)
+                double = self.__armed[key] and (timestamp - self.__released_at[key]) & _TICKS_MASK < self.double_press_ms
+                if double:
+                    self.__push(DOUBLE_PRESS, key, timestamp)
+                state[key] = _DOWN
+                self.__pressed_at[key] = timestamp
+                self.__armed[key] = 0
+                self.__second[key] = double
+            else:
+                self.__push(RELEASE, key, timestamp)
+                # Only a short press can start a double press, and a third
+                # quick press starts again rather than making another double
+                self.__armed[key] = state[key] == _DOWN and not self.__second[key]
+                state[key] = _UP
+                self.__released_at[key] = timestamp
+
+        now = -1
+        for key in range(len(state)):
+            if state[key] == _DOWN:
+                if now < 0:
+                    now = supervisor.ticks_ms()
+                if (now - self.__pressed_at[key]) & _TICKS_MASK >= self.long_press_ms:
+                    state[key] = _LONG
+                    self.__push(LONG_PRESS, key, (self.__pressed_at[key] + self.long_press_ms) & _TICKS_MASK)
+
+    def get(self):
+        # The next event, or None if there aren't any
+        if self.__length == 0:
+            return None
+        i = self.__head
+        event = self.event
+        event.kind = self.__kinds[i]
+        event.key = self.__keys[i]
+        event.timestamp = self.__times[i]
+        self.__head = (i + 1) % QUEUE_SIZE
+        self.__length -= 1
+        return event
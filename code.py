@@ -1,5 +1,4 @@
 import board
-import time
 
 import supervisor
 
@@ -7,30 +6,98 @@ from display import *
 from button import *
 from accelerometer import *
 from mode import *
+from scheduler import *
+from telemetry import *
+from settings import *
+from governor import *
+from sleeper import *
+
+# Set to True to run everything as asyncio tasks (see async_runtime.py)
+# instead of one loop. Modes work the same either way. The firmware doesn't
+# include asyncio itself: copy the asyncio and adafruit_ticks libraries from
+# the CircuitPython library bundle into the lib folder on CIRCUITPY first.
+USE_ASYNCIO = False
+
+# Brightness for every mode, out of 256, and a cap on the current all the
+# LEDs can draw together, where one LED fully on is 255 (None for no cap).
+# Lower either one to make the batteries last longer.
+BRIGHTNESS = 256
+POWER_BUDGET = None
 
 display = Display(0, 60)
+display.set_brightness(BRIGHTNESS)
+display.set_power_budget(POWER_BUDGET)
 
-button_left = Button(board.MODE_L)
-button_right = Button(board.MODE_R)
+# Keys are numbered in this order in button events
+BUTTON_PINS = (board.MODE_L, board.MODE_R)
+buttons = Buttons(BUTTON_PINS)
+BUTTON_LEFT = 0
+BUTTON_RIGHT = 1
 
 accel = Accelerometer()
 
 
-mode_switcher = ModeSwitcher(display, accel)
+settings = Settings()
+mode_switcher = ModeSwitcher(display, accel, settings)
+
+
+telemetry = Telemetry()
 
+def handle_buttons():
+    buttons.update()
+    event = buttons.get()
+    while event is not None:
+        if event.kind == PRESS:
+            if event.key == BUTTON_LEFT:
+                mode_switcher.advance_mode_group()
+            elif event.key == BUTTON_RIGHT:
+                mode_switcher.advance_mode()
+        event = buttons.get()
 
-while True:
-    start_time = time.monotonic()
+def poll_input():
+    handle_buttons()
+    accel.update()
+    telemetry.poll_serial()
 
+# Sleeps while a static mode is showing, until a button is pressed or the
+# snowflake is moved
+sleeper = Sleeper(buttons, BUTTON_PINS, accel, settings)
+
+# Slows the frame rate down for modes that can't keep up with their delay
+governor = FrameGovernor()
+
+def run_frame():
     current_mode = mode_switcher.get_current_mode()
+    display.dt_us = scheduler.frame_ns // 1000
 
     current_mode.draw()
+    changed = display.present()
+
+    delay = governor.update(current_mode, scheduler.busy_ns)
+    slack = scheduler.wait(delay)
+    telemetry.record(current_mode, scheduler.busy_ns, slack, scheduler.frame_ns)
+
+    # Nothing will change until there's some input, so stop drawing
+    if not changed and getattr(current_mode, 'static', False):
+        sleeper.until_input(telemetry.poll_serial)
+        scheduler.resume()
 
-    # Busy-wait until the mode's delay period has elapsed
-    while time.monotonic() - start_time < current_mode.delay:
-        pass
 
-    if button_left.is_pressed():
-        mode_switcher.advance_mode_group()
-    if button_right.is_pressed():
-        mode_switcher.advance_mode()
+if USE_ASYNCIO:
+    # Each job runs as its own task, see async_runtime.py
+    from async_runtime import AsyncRuntime
+    runtime = AsyncRuntime(display, mode_switcher, telemetry, governor, sleeper)
+    accel.ready = runtime.event()
+    runtime.every(0.005, handle_buttons)
+    runtime.every(0.005, accel.update)
+    # Settings count calls before saving, so this saves 2 s after a change
+    runtime.every(0.02, settings.flush)
+    runtime.every(0.05, telemetry.poll_serial)
+    runtime.run()
+else:
+    # Sleeps until each frame is due, checking the buttons every 5 ms
+    # meanwhile, and saves settings between frames once they've stopped
+    # changing
+    scheduler = FrameScheduler(poll_input, idle=settings.flush)
+    while True:
+        run_frame()
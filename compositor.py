@@ -0,0 +1,191 @@
+# Runs several modes at once and blends them together.
+#
+# Each layer has its own 48-byte frame, which keeps that mode's picture
+# between frames. To draw a layer, its frame is copied into display.frame,
+# the mode draws as usual, and the result is copied back, so modes don't need
+# to know they're in a layer. Then the layers are blended bottom to top into
+# display.frame, ready for present().
+#
+# How a layer is blended onto the ones below it:
+# * ADD: adds its brightness (saturating at 255), good for sparkles
+# * MAX: keeps whichever is brighter
+# * MULTIPLY: darkens what's below, where the layer is dark
+# * ALPHA: covers what's below, mixing by the layer's opacity
+#
+# Opacity is out of 256, like Display.scale_all(). The bottom layer is
+# blended onto black, so its opacity just dims it.
+#
+# Crossfade, at the bottom, mixes the same way between the old picture and a
+# mode that's just started, for switching modes smoothly.
+
+from array import array
+
+from display import _SATURATE, _scale_lut
+
+ADD = 0
+MAX = 1
+MULTIPLY = 2
+ALPHA = 3
+
+# Blending uses tables made for each opacity the first time it's used (the
+# scaling ones are shared with display.py), so flattening costs the same
+# whatever is drawn
+_multiply_luts = {}
+
+def _multiply_lut(opacity):
+    # What to multiply the layer below by (out of 256) for each value here
+    lut = _multiply_luts.get(opacity)
+    if lut is None:
+        lut = array('H', [256 - opacity + opacity * i // 255 for i in range(256)])
+        _multiply_luts[opacity] = lut
+    return lut
+
+class Layer:
+    def __init__(self, mode=None, blend=ALPHA, opacity=256):
+        self.frame = bytearray(48)
+        self.mode = mode
+        self.blend = blend
+        self.opacity = opacity
+        self.visible = True
+
+class Compositor:
+    # Has the same start(), draw() and delay as a mode, so it can go anywhere
+    # a mode can. delay comes from the bottom layer's mode unless it's set.
+    def __init__(self, display, layers=(), name=None, delay=None):
+        self.display = display
+        self.layers = list(layers)
+        self.name = name
+        self.__delay = delay
+
+    @property
+    def delay(self):
+        if self.__delay is not None:
+            return self.__delay
+        for layer in self.layers:
+            if layer.mode is not None:
+                return layer.mode.delay
+        return 0.01
+
+    @delay.setter
+    def delay(self, value):
+        self.__delay = value
+
+    def start(self):
+        frame = self.display.frame
+        for layer in self.layers:
+            if layer.mode is not None:
+                frame[:] = layer.frame
+                layer.mode.start()
+                layer.frame[:] = frame
+
+    def draw(self):
+        frame = self.display.frame
+        for layer in self.layers:
+            if layer.visible and layer.mode is not None:
+                frame[:] = layer.frame
+                layer.mode.draw()
+                layer.frame[:] = frame
+        self.flatten()
+
+    def flatten(self):
+        frame = self.display.frame
+        first = True
+        for layer in self.layers:
+            if not layer.visible:
+                continue
+            if first:
+                # Nothing below yet, so this is just a dimmed copy
+                first = False
+                if layer.opacity >= 256:
+                    frame[:] = layer.frame
+                else:
+                    lut = _scale_lut(layer.opacity)
+                    top = layer.frame
+                    for i in range(48):
+                        frame[i] = lut[top[i]]
+            else:
+                self.blend(frame, layer.frame, layer.blend, layer.opacity)
+        if first:
+            self.display.set_all(0)
+
+    def blend(self, frame, top, blend, opacity):
+        # Blend a 48-byte frame onto frame
+        if blend == ADD:
+            lut = _scale_lut(opacity)
+            saturate = _SATURATE
+            for i in range(48):
+                frame[i] = saturate[frame[i] + lut[top[i]]]
+        elif blend == MAX:
+            lut = _scale_lut(opacity)
+            for i in range(48):
+                value = lut[top[i]]
+                if value > frame[i]:
+                    frame[i] = value
+        elif blend == MULTIPLY:
+            lut = _multiply_lut(opacity)
+            for i in range(48):
+                frame[i] = (frame[i] * lut[top[i]]) >> 8
+        else:
+            lut = _scale_lut(opacity)
+            below = _scale_lut(256 - opacity)
+            for i in range(48):
+                frame[i] = below[frame[i]] + lut[top[i]]
+
+# How many steps a Crossfade takes from one frame to the other
+CROSSFADE_LEVELS = 16
+
+class Crossfade:
+    # Fades from whatever is on the display to a new mode over duration
+    # seconds, going by display.dt_us, so it takes as long whatever the frame
+    # rate. Set mode and call start() instead of the mode's own start(). The
+    # mode starts from the frame on the display and runs in a frame of its
+    # own, just as it would without the fade, and each frame that is mixed
+    # with the old picture. Once done is True, display.frame is the mode's own
+    # frame again, so it can carry on by itself.
+    #
+    # The tables for every level are made up front, so a fade costs one
+    # 48-LED pass on top of the mode, and builds nothing while it runs.
+    def __init__(self, display, duration=0.5):
+        self.display = display
+        self.mode = None
+        self.duration = duration
+        self.done = True
+        self.outgoing = bytearray(48)
+        self.incoming = bytearray(48)
+        self.__elapsed_us = 0
+        self.__luts = tuple(
+            (_scale_lut(256 - opacity), _scale_lut(opacity))
+            for opacity in (level * 256 // CROSSFADE_LEVELS for level in range(CROSSFADE_LEVELS))
+        )
+
+    @property
+    def delay(self):
+        if self.mode is not None:
+            return self.mode.delay
+        return 0.01
+
+    def start(self):
+        frame = self.display.frame
+        self.outgoing[:] = frame
+        self.mode.start()
+        self.incoming[:] = frame
+        frame[:] = self.outgoing
+        self.__duration_us = int(self.duration * 1000000)
+        self.__elapsed_us = 0
+        self.done = False
+
+    def draw(self):
+        frame = self.display.frame
+        incoming = self.incoming
+        frame[:] = incoming
+        self.mode.draw()
+        incoming[:] = frame
+
+        self.__elapsed_us += self.display.dt_us
+        if self.__elapsed_us >= self.__duration_us:
+            self.done = True
+            return
+        fade_out, fade_in = self.__luts[self.__elapsed_us * CROSSFADE_LEVELS // self.__duration_us]
+        outgoing = self.outgoing
+        for i in range(48):
+            frame[i] = fade_out[outgoing[i]] + fade_in[incoming[i]]
@@ -1,7 +1,148 @@
+import math
+from array import array
+
 import xmas3
 
+# Drivers that can take a whole frame in one call expose set_leds(buffer).
+# The stock firmware only has set_led(), so we fall back to one call per LED.
+_set_leds = getattr(xmas3, 'set_leds', None)
+
+# Whole-frame operations map every LED through a 256-entry lookup table.
+# Tables are built the first time an amount is used and cached after that,
+# so steady-state drawing never rebuilds them.
+_add_luts = {}
+_subtract_luts = {}
+_scale_luts = {}
+_threshold_luts = {}
+_max_luts = {}
+_fills = {}
+
+def _add_lut(amount):
+    # Subtracting is kept separately under the amount taken away, so
+    # subtract_all() never has to make a negative number. Anything past 255
+    # gives the same table, so there are at most 255 of each.
+    if amount < 0:
+        luts = _subtract_luts
+        amount = -amount
+        sign = -1
+    else:
+        luts = _add_luts
+        sign = 1
+    if amount > 255:
+        amount = 255
+    lut = luts.get(amount)
+    if lut is None:
+        lut = bytes(min(255, max(0, i + sign * amount)) for i in range(256))
+        luts[amount] = lut
+    return lut
+
+# Saturating adds can be done in parts (adding 5 then 3 gives the same as
+# adding 8, even if it hits 255 on the way), so add_all() and subtract_all()
+# do any amount they don't have a table for as a few of these powers of two
+# in a row. That way amounts that change from frame to frame (like a fade
+# over however many steps have passed) never build a table while drawing.
+_ADD_POWERS = tuple(_add_lut(1 << bit) for bit in range(8))
+_SUBTRACT_POWERS = tuple(_add_lut(-(1 << bit)) for bit in range(8))
+
+def _scale_lut(factor):
+    lut = _scale_luts.get(factor)
+    if lut is None:
+        lut = bytes(min(255, (i * factor) >> 8) for i in range(256))
+        _scale_luts[factor] = lut
+    return lut
+
+def _threshold_lut(level):
+    lut = _threshold_luts.get(level)
+    if lut is None:
+        lut = bytes(i if i >= level else 0 for i in range(256))
+        _threshold_luts[level] = lut
+    return lut
+
+def _max_lut(value):
+    lut = _max_luts.get(value)
+    if lut is None:
+        lut = bytes(max(i, value) for i in range(256))
+        _max_luts[value] = lut
+    return lut
+
+# Any sum of two bytes, clamped to 255, for adding without a branch
+_SATURATE = bytes(min(255, i) for i in range(511))
+
+def _fill(value):
+    fill = _fills.get(value)
+    if fill is None:
+        fill = bytes((value,)) * 48
+        _fills[value] = fill
+    return fill
+
+# Roughly how much current each value draws, out of 255, going by the
+# gamma curve the driver dims the LEDs with. Only used to keep within
+# Display's power budget, so it doesn't have to be exact.
+DRIVER_GAMMA = 2.2
+_DRIVE = bytes(round(255 * (i / 255) ** DRIVER_GAMMA) for i in range(256))
+
+# To cut the current to ratio / 256 of what it was, scale every value by
+# _LIMIT_SCALE[ratio] / 256
+_LIMIT_SCALE = array('H', [int(256 * (ratio / 256) ** (1 / DRIVER_GAMMA)) for ratio in range(257)])
+
+# CPython can run the table in one C call. CircuitPython's bytearray has no
+# translate(), so there it is a branch-free indexed loop instead.
+if hasattr(bytearray, 'translate'):
+    def _translate(frame, lut):
+        frame[:] = frame.translate(lut)
+else:
+    def _translate(frame, lut):
+        for i in range(48):
+            frame[i] = lut[frame[i]]
+
+# Geometry of the snowflake, in units where the inner ring is 10 from the
+# centre and the arm tips are 50. x points right and y points down (as you
+# look at the front), and angles are in degrees clockwise from the top.
+#
+# Where each LED sits on its arm, as (distance out from the centre, distance
+# to the side, clockwise positive). 1 and 4 are on one side, 2 and 5 on the
+# other, and 3 sits between them on the middle of the arm.
+_ARM_LAYOUT = ((10, 0), (20, -6), (20, 6), (25, 0), (30, -6), (30, 6), (40, 0), (50, 0))
+
+# Angles are looked up through a table with one entry per ANGLE_BINS'th of a turn
+ANGLE_BINS = 72
+
+def angle_bin(angle):
+    return (angle % 360) * ANGLE_BINS // 360
+
+# The arm nearest to each angle bin (arm A is at 0 degrees, B at 60 and so on)
+ARM_BY_ANGLE = bytes(((b * 360 + 180) // ANGLE_BINS + 30) // 60 % 6 for b in range(ANGLE_BINS))
+
+# Bits for Display.LED_RINGS, in the same order as Display.RINGS
+RING_A_BIT = 1
+RING_B1_BIT = 2
+RING_B2_BIT = 4
+RING_C_BIT = 8
+RING_D_BIT = 16
+
+# Display.nearest_led() divides the snowflake into square cells this big and
+# remembers the NEAREST_COUNT closest LEDs to the middle of each
+NEAREST_CELL = 10
+NEAREST_CELLS = 11
+NEAREST_COUNT = 3
+
+# Where each position on an arm is in the frame, relative to the arm's first
+# LED. Arm A starts at 0 and the others go anticlockwise in blocks of 8.
+_ARM_ORDER = (7, 6, 5, 2, 3, 4, 1, 0)
+
+# The frame index of an LED by name, like 'A0' (the centre end of arm A) or
+# 'F7' (the tip of arm F)
+def led_index(name):
+    if len(name) == 2:
+        arm = ord(name[0]) - ord('A')
+        position = ord(name[1]) - ord('0')
+        if 0 <= arm < 6 and 0 <= position < 8:
+            return (6 - arm) % 6 * 8 + _ARM_ORDER[position]
+    raise ValueError('No LED called {}'.format(name))
+
 class Led:
-    def __init__(self, index):
+    def __init__(self, frame, index):
+        self.frame = frame
         self.index = index
 
     def set(self, value):
@@ -9,16 +150,35 @@ class Led:
             value = 0
         if value > 255:
             value = 255
-        xmas3.set_led(self.index, value)
+        self.frame[self.index] = value
 
     def get(self):
-        return xmas3.get_led(self.index)
+        return self.frame[self.index]
 
     def add(self, value):
-        self.set(self.get() + value)
+        self.set(self.frame[self.index] + value)
 
     def subtract(self, value):
-        self.set(self.get() - value)
+        self.set(self.frame[self.index] - value)
+
+# A group of LEDs, as the frame index of each one in order. Indexing or
+# iterating gives Led objects for convenience, but those are made on the spot,
+# so draw() code should use indexes with the frame or the Display.*_group()
+# methods instead.
+class LedGroup:
+    def __init__(self, frame, indexes):
+        self.frame = frame
+        self.indexes = bytes(indexes)
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __getitem__(self, i):
+        return Led(self.frame, self.indexes[i])
+
+    def __iter__(self):
+        for index in self.indexes:
+            yield Led(self.frame, index)
 
 class Display:
     def __init__(self, polling_delay_us = None, min_freq = None):
@@ -42,140 +202,357 @@ class Display:
         else:
             xmas3.start_display(polling_delay_us, min_freq)
 
-        self.A0 = Led(7)
-        self.A1 = Led(6)
-        self.A2 = Led(5)
-        self.A3 = Led(2)
-        self.A4 = Led(3)
-        self.A5 = Led(4)
-        self.A6 = Led(1)
-        self.A7 = Led(0)
-        self.B0 = Led(47)
-        self.B1 = Led(46)
-        self.B2 = Led(45)
-        self.B3 = Led(42)
-        self.B4 = Led(43)
-        self.B5 = Led(44)
-        self.B6 = Led(41)
-        self.B7 = Led(40)
-        self.C0 = Led(39)
-        self.C1 = Led(38)
-        self.C2 = Led(37)
-        self.C3 = Led(34)
-        self.C4 = Led(35)
-        self.C5 = Led(36)
-        self.C6 = Led(33)
-        self.C7 = Led(32)
-        self.D0 = Led(31)
-        self.D1 = Led(30)
-        self.D2 = Led(29)
-        self.D3 = Led(26)
-        self.D4 = Led(27)
-        self.D5 = Led(28)
-        self.D6 = Led(25)
-        self.D7 = Led(24)
-        self.E0 = Led(23)
-        self.E1 = Led(22)
-        self.E2 = Led(21)
-        self.E3 = Led(18)
-        self.E4 = Led(19)
-        self.E5 = Led(20)
-        self.E6 = Led(17)
-        self.E7 = Led(16)
-        self.F0 = Led(15)
-        self.F1 = Led(14)
-        self.F2 = Led(13)
-        self.F3 = Led(10)
-        self.F4 = Led(11)
-        self.F5 = Led(12)
-        self.F6 = Led(9)
-        self.F7 = Led(8)
-
-        self.ARM_A = [self.A0, self.A1, self.A2, self.A3, self.A4, self.A5, self.A6, self.A7]
-        self.ARM_B = [self.B0, self.B1, self.B2, self.B3, self.B4, self.B5, self.B6, self.B7]
-        self.ARM_C = [self.C0, self.C1, self.C2, self.C3, self.C4, self.C5, self.C6, self.C7]
-        self.ARM_D = [self.D0, self.D1, self.D2, self.D3, self.D4, self.D5, self.D6, self.D7]
-        self.ARM_E = [self.E0, self.E1, self.E2, self.E3, self.E4, self.E5, self.E6, self.E7]
-        self.ARM_F = [self.F0, self.F1, self.F2, self.F3, self.F4, self.F5, self.F6, self.F7]
-
-        self.ARMS = [self.ARM_A, self.ARM_B, self.ARM_C, self.ARM_D, self.ARM_E, self.ARM_F]
+        # All drawing goes into this back buffer, indexed by xmas3 LED number.
+        # Nothing reaches the LEDs until present() is called, so half-drawn
+        # frames are never shown. With xmas3.set_leds() the second core gets
+        # each frame in one go; the stock firmware only has set_led(), and the
+        # driver can show a frame while present() is partway through it.
+        self.frame = bytearray(48)
+        self.__front = bytearray(48)
+        # The frame as it was at the last present(), to tell if it changed
+        self.__last = bytearray(48)
+        # The first present() sends everything, whatever the driver started with
+        self.__synced = False
+        # Whether the front buffer still matches __last with the current
+        # brightness and power budget
+        self.__fresh = False
+        # How many present() calls had nothing to send
+        self.skipped = 0
+
+        # The output stage, see set_brightness() and set_power_budget()
+        self.brightness = 256
+        self.gamma = 1.0
+        self.power_budget = None
+        # How many frames were dimmed to keep within the power budget
+        self.limited = 0
+        self.__lut = None
+        self.__output = bytearray(48)
+
+        # Microseconds since the previous frame, set by the main loop before
+        # each draw(). 0 means unknown (like when rendering frame tables), so
+        # modes should treat it as one frame at their own delay.
+        self.dt_us = 0
+
+        # LED groups are index vectors into the frame, see LedGroup. Single
+        # LEDs (A0 to F7) are made the first time they're asked for.
+        self.ARM_A = self.group('A0 A1 A2 A3 A4 A5 A6 A7')
+        self.ARM_B = self.group('B0 B1 B2 B3 B4 B5 B6 B7')
+        self.ARM_C = self.group('C0 C1 C2 C3 C4 C5 C6 C7')
+        self.ARM_D = self.group('D0 D1 D2 D3 D4 D5 D6 D7')
+        self.ARM_E = self.group('E0 E1 E2 E3 E4 E5 E6 E7')
+        self.ARM_F = self.group('F0 F1 F2 F3 F4 F5 F6 F7')
+
+        self.ARMS = (self.ARM_A, self.ARM_B, self.ARM_C, self.ARM_D, self.ARM_E, self.ARM_F)
 
         # The inner ring of 6 LEDs, starting with the one on top, going clockwise
-        self.RING_A = [self.A0, self.B0, self.C0, self.D0, self.E0, self.F0]
+        self.RING_A = self.group('A0 B0 C0 D0 E0 F0')
         # The second ring, starting at top, going clockwise
-        self.RING_B1 = [self.A3, self.A2, self.B1, self.B3, self.B2, self.C1, self.C3, self.C2, self.D1, self.D3, self.D2, self.E1, self.E3, self.E2, self.F1, self.F3, self.F2, self.A1]
+        self.RING_B1 = self.group('A3 A2 B1 B3 B2 C1 C3 C2 D1 D3 D2 E1 E3 E2 F1 F3 F2 A1')
         # The third ring, which shares some with the second ring
-        self.RING_B2 = [self.A3, self.A5, self.B4, self.B3, self.B5, self.C4, self.C3, self.C5, self.D4, self.D3, self.D5, self.E4, self.E3, self.E5, self.F4, self.F3, self.F5, self.A4]
-        self.RING_C = [self.A6, self.B6, self.C6, self.D6, self.E6, self.F6]
-        self.RING_D = [self.A7, self.B7, self.C7, self.D7, self.E7, self.F7]
-
-        self.ALL = [
-            self.A0,
-            self.A1,
-            self.A2,
-            self.A3,
-            self.A4,
-            self.A5,
-            self.A6,
-            self.A7,
-            self.B0,
-            self.B1,
-            self.B2,
-            self.B3,
-            self.B4,
-            self.B5,
-            self.B6,
-            self.B7,
-            self.C0,
-            self.C1,
-            self.C2,
-            self.C3,
-            self.C4,
-            self.C5,
-            self.C6,
-            self.C7,
-            self.D0,
-            self.D1,
-            self.D2,
-            self.D3,
-            self.D4,
-            self.D5,
-            self.D6,
-            self.D7,
-            self.E0,
-            self.E1,
-            self.E2,
-            self.E3,
-            self.E4,
-            self.E5,
-            self.E6,
-            self.E7,
-            self.F0,
-            self.F1,
-            self.F2,
-            self.F3,
-            self.F4,
-            self.F5,
-            self.F6,
-            self.F7,
-        ]
+        self.RING_B2 = self.group('A3 A5 B4 B3 B5 C4 C3 C5 D4 D3 D5 E4 E3 E5 F4 F3 F5 A4')
+        self.RING_C = self.group('A6 B6 C6 D6 E6 F6')
+        self.RING_D = self.group('A7 B7 C7 D7 E7 F7')
+
+        # Every LED, arm by arm
+        self.ALL = LedGroup(self.frame, b''.join(arm.indexes for arm in self.ARMS))
+
+        self.RINGS = (self.RING_A, self.RING_B1, self.RING_B2, self.RING_C, self.RING_D)
+
+        # Scratch space for rotate()
+        self.__scratch = bytearray(48)
+
+        self.__build_geometry()
+
+    def __build_geometry(self):
+        # Everything here is indexed by xmas3 LED number, like self.frame
+        self.LED_X = array('b', [0] * 48)
+        self.LED_Y = array('b', [0] * 48)
+        self.LED_ANGLE = array('H', [0] * 48)
+        self.LED_RADIUS = bytearray(48)
+        self.LED_ARM = bytearray(48)
+        self.LED_RINGS = bytearray(48)
+
+        for arm_index in range(6):
+            theta = math.radians(arm_index * 60)
+            out_x = math.sin(theta)
+            out_y = -math.cos(theta)
+            for position in range(8):
+                distance, side = _ARM_LAYOUT[position]
+                x = distance * out_x - side * out_y
+                y = distance * out_y + side * out_x
+                i = self.ARMS[arm_index].indexes[position]
+                self.LED_X[i] = round(x)
+                self.LED_Y[i] = round(y)
+                self.LED_ANGLE[i] = round(math.degrees(math.atan2(x, -y))) % 360
+                self.LED_RADIUS[i] = round(math.sqrt(x * x + y * y))
+                self.LED_ARM[i] = arm_index
+
+        for ring_index in range(len(self.RINGS)):
+            for i in self.RINGS[ring_index].indexes:
+                self.LED_RINGS[i] |= 1 << ring_index
+
+        # For each ring, the LED nearest to each angle bin
+        self.RING_BY_ANGLE = []
+        for ring in self.RINGS:
+            table = bytearray(ANGLE_BINS)
+            for b in range(ANGLE_BINS):
+                angle = (b * 360 + 180) // ANGLE_BINS
+                best = 360
+                for i in ring.indexes:
+                    difference = abs(self.LED_ANGLE[i] - angle) % 360
+                    if difference > 180:
+                        difference = 360 - difference
+                    if difference < best:
+                        best = difference
+                        table[b] = i
+            self.RING_BY_ANGLE.append(bytes(table))
+
+        # Built the first time nearest_led() is called, to keep boot quick
+        self.__nearest = None
+
+    def __build_nearest(self):
+        half = NEAREST_CELLS * NEAREST_CELL // 2
+        table = bytearray(NEAREST_CELLS * NEAREST_CELLS * NEAREST_COUNT)
+        for row in range(NEAREST_CELLS):
+            for column in range(NEAREST_CELLS):
+                x = column * NEAREST_CELL - half + NEAREST_CELL // 2
+                y = row * NEAREST_CELL - half + NEAREST_CELL // 2
+                by_distance = sorted(range(48), key=lambda i: (self.LED_X[i] - x) ** 2 + (self.LED_Y[i] - y) ** 2)
+                start = (row * NEAREST_CELLS + column) * NEAREST_COUNT
+                table[start:start + NEAREST_COUNT] = bytes(by_distance[:NEAREST_COUNT])
+        self.__nearest = bytes(table)
+
+    def __getattr__(self, name):
+        # Only called for attributes that don't exist yet, so each named LED
+        # is made once, when something first uses it
+        try:
+            led = Led(self.frame, led_index(name))
+        except ValueError:
+            raise AttributeError(name)
+        setattr(self, name, led)
+        return led
+
+    # A LedGroup from LED names separated by spaces, like 'A0 B0 C0'
+    def group(self, names):
+        return LedGroup(self.frame, bytes(led_index(name) for name in names.split()))
+
+    # The arm nearest to an angle in degrees, as an index into ARMS
+    def arm_at_angle(self, angle):
+        return ARM_BY_ANGLE[angle_bin(angle)]
+
+    # The LED on RINGS[ring_index] nearest to an angle, as an index into frame
+    def led_at_angle(self, ring_index, angle):
+        return self.RING_BY_ANGLE[ring_index][angle_bin(angle)]
+
+    # The LED nearest to a point (rank 0), or the next nearest (rank 1, 2),
+    # as an index into frame. Points off the edge use the nearest cell.
+    def nearest_led(self, x, y, rank=0):
+        if self.__nearest is None:
+            self.__build_nearest()
+        half = NEAREST_CELLS * NEAREST_CELL // 2
+        column = (x + half) // NEAREST_CELL
+        row = (y + half) // NEAREST_CELL
+        if column < 0:
+            column = 0
+        elif column >= NEAREST_CELLS:
+            column = NEAREST_CELLS - 1
+        if row < 0:
+            row = 0
+        elif row >= NEAREST_CELLS:
+            row = NEAREST_CELLS - 1
+        return self.__nearest[(row * NEAREST_CELLS + column) * NEAREST_COUNT + rank]
 
     def set_all(self, value):
-        for i in range(48):
-            xmas3.set_led(i, value)
+        if value < 0:
+            value = 0
+        if value > 255:
+            value = 255
+        self.frame[:] = _fill(value)
 
     def add_all(self, value):
-        for i in range(48):
-            val = xmas3.get_led(i)
-            val += value
-            if val > 255:
-                val = 255
-            xmas3.set_led(i, val)
+        if value < 0:
+            self.__apply(-value, _subtract_luts, _SUBTRACT_POWERS)
+        else:
+            self.__apply(value, _add_luts, _ADD_POWERS)
 
     def subtract_all(self, value):
+        if value < 0:
+            self.__apply(-value, _add_luts, _ADD_POWERS)
+        else:
+            self.__apply(value, _subtract_luts, _SUBTRACT_POWERS)
+
+    def __apply(self, amount, luts, powers):
+        if amount > 255:
+            amount = 255
+        lut = luts.get(amount)
+        if lut is not None:
+            _translate(self.frame, lut)
+            return
+        bit = 0
+        while amount:
+            if amount & 1:
+                _translate(self.frame, powers[bit])
+            amount >>= 1
+            bit += 1
+
+    # Make the table for add_all(value) (or subtract_all(-value)) now, so it
+    # takes one pass instead of a few. Call it from a mode's start() for
+    # amounts it uses every frame.
+    def prepare_add(self, value):
+        _add_lut(value)
+
+    # Multiply every LED by factor / 256, so 128 halves and 256 keeps the frame
+    def scale_all(self, factor):
+        _translate(self.frame, _scale_lut(factor))
+
+    # Turn off every LED dimmer than level, leave the rest alone
+    def threshold_all(self, level):
+        _translate(self.frame, _threshold_lut(level))
+
+    # Raise every LED to at least value
+    def max_all(self, value):
+        _translate(self.frame, _max_lut(value))
+
+    def set_group(self, group, value):
+        if value < 0:
+            value = 0
+        if value > 255:
+            value = 255
+        frame = self.frame
+        for i in group.indexes:
+            frame[i] = value
+
+    def add_group(self, group, value):
+        frame = self.frame
+        lut = _add_lut(value)
+        for i in group.indexes:
+            frame[i] = lut[frame[i]]
+
+    # Set the LEDs of a group in order from start to end, evenly spaced
+    def fill_gradient(self, group, start, end):
+        if start < 0:
+            start = 0
+        if start > 255:
+            start = 255
+        if end < 0:
+            end = 0
+        if end > 255:
+            end = 255
+        frame = self.frame
+        indexes = group.indexes
+        steps = len(indexes) - 1
+        if steps == 0:
+            frame[indexes[0]] = start
+            return
+        for k in range(steps + 1):
+            frame[indexes[k]] = start + (end - start) * k // steps
+
+    # Move the values of a group along it by steps (wrapping around), so
+    # rotate(RING_A) moves every LED on the inner ring one place clockwise
+    def rotate(self, group, steps=1):
+        frame = self.frame
+        scratch = self.__scratch
+        indexes = group.indexes
+        count = len(indexes)
+        for k in range(count):
+            scratch[k] = frame[indexes[k]]
+        steps %= count
+        for k in range(count):
+            frame[indexes[(k + steps) % count]] = scratch[k]
+
+    # Merge another 48-byte frame into this one, keeping the brighter of each LED
+    def merge_max(self, other):
+        frame = self.frame
+        for i in range(48):
+            val = other[i]
+            if val > frame[i]:
+                frame[i] = val
+
+    # Scale everything sent to the LEDs by brightness / 256 (256 shows
+    # frames as drawn). gamma bends the values first: 1.0 leaves them alone,
+    # above 1 makes the middle values dimmer. The driver already
+    # gamma-corrects, so this is only an adjustment on top. Modes keep
+    # drawing 0 to 255 as usual.
+    def set_brightness(self, brightness, gamma=1.0):
+        brightness = max(0, min(256, brightness))
+        if brightness == 256 and gamma == 1.0:
+            self.__lut = None
+        else:
+            self.__lut = bytes(min(255, round(255 * (i / 255) ** gamma * brightness / 256)) for i in range(256))
+        self.brightness = brightness
+        self.gamma = gamma
+        self.__fresh = False
+
+    # Limit how much current all the LEDs can draw at once. The budget is in
+    # units where one LED fully on is 255, so 12 * 255 allows as much as 12
+    # LEDs at full brightness. Frames that would go over are dimmed evenly
+    # until they fit. None turns the limit off.
+    def set_power_budget(self, budget):
+        self.power_budget = budget
+        self.__fresh = False
+
+    def __limit(self, output):
+        # Roughly how much current the frame draws, going by the driver's
+        # gamma curve, and dim it if that's over budget
+        drive = _DRIVE
+        total = 0
+        for value in output:
+            total += drive[value]
+        budget = self.power_budget
+        if total <= budget:
+            return
+        self.limited += 1
+        factor = _LIMIT_SCALE[budget * 256 // total]
         for i in range(48):
-            val = xmas3.get_led(i)
-            val -= value
-            if val < 0:
-                val = 0
-            xmas3.set_led(i, val)
+            output[i] = (output[i] * factor) >> 8
+
+    def present(self):
+        # Send the frame to the LEDs. Only LEDs that changed since the last
+        # present() are sent, and nothing at all if none did. __front holds
+        # what the driver has, so a mode can keep drawing into self.frame
+        # while the driver works from it.
+        frame = self.frame
+        if self.__fresh and frame == self.__last:
+            self.skipped += 1
+            return 0
+        self.__last[:] = frame
+
+        # Brightness and the power limit go on a copy, so modes that build
+        # on their last frame still see what they drew
+        if self.__lut is None and self.power_budget is None:
+            output = frame
+        else:
+            output = self.__output
+            output[:] = frame
+            if self.__lut is not None:
+                _translate(output, self.__lut)
+            if self.power_budget is not None:
+                self.__limit(output)
+
+        front = self.__front
+        if _set_leds is not None:
+            if self.__synced and output == front:
+                changed = 0
+            else:
+                front[:] = output
+                _set_leds(front)
+                changed = 48
+        else:
+            set_led = xmas3.set_led
+            changed = 0
+            synced = self.__synced
+            for i in range(48):
+                value = output[i]
+                if value != front[i] or not synced:
+                    front[i] = value
+                    set_led(i, value)
+                    changed += 1
+        self.__synced = True
+        self.__fresh = True
+        return changed
+
+    # Make the next present() send every LED, e.g. if something else has
+    # called xmas3.set_led() directly
+    def invalidate(self):
+        self.__synced = False
+        self.__fresh = False
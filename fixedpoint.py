@@ -0,0 +1,82 @@
+# Integer maths for modes.
+#
+# On the snowflake every float is a separate object on the heap, so float
+# maths in draw() slowly fills up memory until the garbage collector has to
+# stop and clear it. Small integers don't cost anything, so these helpers do
+# everything with them instead.
+#
+# Fixed-point numbers here are Q8.8: the real value times 256, so ONE is 1.0
+# and 384 is 1.5. Tables are indexed by a byte (0-255), where 256 steps make
+# a full cycle (for waves) or go from start to end (for easing).
+
+import math
+from array import array
+
+SHIFT = 8
+ONE = 1 << SHIFT
+
+def to_fixed(value):
+    return int(value * ONE)
+
+def mul(a, b):
+    return (a * b) >> SHIFT
+
+def div(a, b):
+    return (a << SHIFT) // b
+
+# Go from a to b as t goes from 0 to 256
+def lerp(a, b, t):
+    return a + (((b - a) * t) >> SHIFT)
+
+# sin of phase/256 of a turn, in Q8.8 (-256 to 256)
+SINE = array('h', [round(math.sin(math.pi * 2 * i / 256) * ONE) for i in range(256)])
+
+def sin(phase):
+    return SINE[phase & 0xFF]
+
+def cos(phase):
+    return SINE[(phase + 64) & 0xFF]
+
+# Waves that go 0 -> 255 -> 0 over 256 steps, for brightness
+TRIANGLE = bytes(255 - abs(255 - 2 * i) for i in range(256))
+SINE_WAVE = bytes(round((1 - math.cos(math.pi * 2 * i / 256)) * 127.5) for i in range(256))
+
+# Easing curves, from 0 to 255 as t goes from 0 to 255
+EASE_IN = bytes(i * i // 255 for i in range(256))
+EASE_OUT = bytes(255 - (255 - i) * (255 - i) // 255 for i in range(256))
+EASE_IN_OUT = bytes(i * i * (765 - 2 * i) // 65025 for i in range(256))
+
+def isqrt(n):
+    # Largest integer whose square is at most n
+    if n <= 0:
+        return 0
+    x = n
+    y = (x + 1) >> 1
+    while y < x:
+        x = y
+        y = (x + n // x) >> 1
+    return x
+
+def dot(a, b):
+    # Dot product of two 3-vectors (tuples or arrays of ints)
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+# atan(i / 64) in degrees, for i from 0 to 64
+_ATAN = bytes(round(math.degrees(math.atan(i / 64))) for i in range(65))
+
+def atan2(y, x):
+    # Like math.degrees(math.atan2(y, x)), but whole degrees from 0 to 359,
+    # accurate to about a degree
+    if x == 0 and y == 0:
+        return 0
+    ax = abs(x)
+    ay = abs(y)
+    if ax >= ay:
+        angle = _ATAN[ay * 64 // ax]
+    else:
+        angle = 90 - _ATAN[ax * 64 // ay]
+    if x < 0:
+        angle = 180 - angle
+    if y < 0:
+        angle = 360 - angle
+    return angle % 360
@@ -0,0 +1,97 @@
+# Picks a frame rate each mode can actually keep up.
+#
+# A mode's delay is how often it would like to draw. If drawing (plus
+# present() and everything else in the frame) takes longer than that, every
+# frame overruns and the timing goes ragged. The governor keeps a running
+# average of what the current mode's frames cost, and if the delay isn't
+# sustainable it picks the fastest of DELAYS_MS that is, with some headroom.
+# It checks again every EVALUATE_FRAMES frames, so it recovers when the load
+# goes away.
+#
+# Modes that want to keep their speed when that happens look at
+# display.dt_us, the time since the previous frame, instead of counting
+# frames (see Steps).
+
+# Frame periods to choose from when a mode's own delay is too fast. Kept as
+# a fixed table so the scheduler sees the same float objects every time.
+DELAYS_MS = (1, 2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 25, 33, 40, 50, 66, 100)
+_DELAYS = tuple(ms / 1000 for ms in DELAYS_MS)
+
+EVALUATE_FRAMES = 32
+
+# Aim for frames that cost at most 4/5 of the period
+HEADROOM_NUM = 5
+HEADROOM_DEN = 4
+
+# The average moves 1/2^COST_SHIFT of the way to each new frame's cost
+COST_SHIFT = 3
+
+class FrameGovernor:
+    def __init__(self):
+        self.mode = None
+        # Running average of frame cost, in microseconds
+        self.cost_us = 0
+        self.delay = None
+        # How many times it had to slow a mode down
+        self.slowdowns = 0
+        self.__nominal_us = 0
+        self.__frames = 0
+
+    def update(self, mode, busy_ns):
+        # Call once per frame with the mode about to wait and how long the
+        # last frame took. Returns the delay to wait for.
+        if mode is not self.mode:
+            # The last frame's cost belongs to the previous mode
+            self.mode = mode
+            self.delay = mode.delay
+            self.__nominal_us = int(mode.delay * 1000000)
+            self.cost_us = 0
+            self.__frames = 0
+            return self.delay
+
+        busy_us = busy_ns // 1000
+        if self.__frames == 0:
+            self.cost_us = busy_us
+        else:
+            self.cost_us += (busy_us - self.cost_us) >> COST_SHIFT
+        self.__frames += 1
+        if self.__frames % EVALUATE_FRAMES == 0:
+            self.__choose()
+        return self.delay
+
+    def __choose(self):
+        target_us = self.cost_us * HEADROOM_NUM // HEADROOM_DEN
+        if target_us <= self.__nominal_us:
+            self.delay = self.mode.delay
+            return
+        for i in range(len(DELAYS_MS)):
+            if DELAYS_MS[i] * 1000 >= target_us:
+                break
+        if _DELAYS[i] > self.delay:
+            self.slowdowns += 1
+        self.delay = _DELAYS[i]
+
+# Turns display.dt_us into how many of a mode's own frames (of delay seconds)
+# have passed, so the mode keeps its speed when the governor gives it fewer
+# frames than it asked for. What's left over carries on to the next frame.
+# At most limit steps are taken at once, so a long stall doesn't make it race
+# to catch up.
+class Steps:
+    def __init__(self, delay, limit=64):
+        self.period_us = max(1, int(delay * 1000000))
+        self.limit = limit
+        self.__carry = 0
+
+    def reset(self):
+        self.__carry = 0
+
+    def advance(self, dt_us):
+        if dt_us <= 0:
+            return 1
+        total = self.__carry + dt_us
+        steps = total // self.period_us
+        if steps > self.limit:
+            self.__carry = 0
+            return self.limit
+        self.__carry = total - steps * self.period_us
+        return steps
@@ -1,11 +1,18 @@
 
-import time
 import gc
-import math
 import random
-import microcontroller
+from array import array
+
+from compositor import ADD, MAX, Compositor, Crossfade, Layer
+from governor import Steps
+from pattern import BRIGHTEN, LIGHT, PAUSE, Pattern, PatternMode, sweep
+from playback import PlaybackMode
+from settings import MODE_GROUP, MODE_INDEX, Settings
 
 class BlinkMode:
+    # Number of frames before the animation repeats, used by PlaybackMode
+    period = 200
+
     def __init__(self, display):
         self.__display = display
         self.delay = 0.01
@@ -25,6 +32,10 @@ class BlinkMode:
 
 
 class ConstantMode:
+    # Draws the same frame until the mode changes, so the snowflake can sleep
+    # (see sleeper.py)
+    static = True
+
     def __init__(self, display, value):
         self.display = display
         self.delay = 0.01
@@ -37,6 +48,8 @@ class ConstantMode:
         self.display.set_all(self.value)
 
 class FadeInMode:
+    period = 256
+
     def __init__(self, display, delay):
         self.display = display
         self.delay = delay
@@ -56,350 +69,125 @@ class PulseMode:
         self.display = display
         self.delay = delay
         self.counter = 0
+        self.__steps = Steps(delay)
 
     def start(self):
         self.counter = 0
+        self.__steps.reset()
 
     def draw(self):
-        if self.counter == 0:
-            self.display.set_all(255)
-        else:
-            self.display.subtract_all(1)
-
-        self.counter = (self.counter + 1) % 500
-
-class StarburstMode:
-    def __init__(self, display, delay):
-        self.display = display
-        self.delay = delay
-        self.counter = 0
-        self.profile = True
-
-    def start(self):
-        self.counter = 0
-
-    def draw(self):
-        if self.profile:
-            gc.collect()
-            gc.disable()
-
-            start_time = time.monotonic()
-            self.display.subtract_all(1)
-            duration = time.monotonic() - start_time
-            print(duration)
-            self.profile = False
-
-            gc.enable()
-        else:
-            self.display.subtract_all(1)
-        
-        ring_index = self.counter // 30
-        if ring_index == 0:
-            ring = self.display.RING_A
-        elif ring_index == 1:
-            ring = self.display.RING_B1
-        elif ring_index == 2:
-            ring = self.display.RING_B2
-        elif ring_index == 3:
-            ring = self.display.RING_C
-        elif ring_index == 4:
-            ring = self.display.RING_D
-        else:
-            ring = []
-        
-        for led in ring:
-            led.add(10)
-
-        self.counter = (self.counter + 1) % 300
-
-class AccelPlumb:
-    def __init__(self, display, accel):
-        self.display = display
-        self.accel = accel
-        self.delay = 0.004
-
-    def start(self):
-        self.display.set_all(0)
-
-    def draw(self):
-        self.display.subtract_all(4)
-
-        acc_vector = self.accel.lis3dh.acceleration
-        print(acc_vector)
-
-        # If you hold it still in some orientation, gravity will read as follows.
-        # +Y is down (bottom arm of snowflake), -Y is up
-        # +X is left, -X is right
-        # +Z is in (toward the snowflake as you look at the front), -Z is out
-
-        # We'll take the dot product with six normalized vectors pointing in the
-        # directions of the arms. Whichever is greatest is the arm that's pointing down.
-        arm_vectors = [
-            ( 0.0,   -1.0, 0),
-            (-0.866, -0.5, 0),
-            (-0.866,  0.5, 0),
-            ( 0.0,    1.0, 0),
-            ( 0.866,  0.5, 0),
-            ( 0.866, -0.5, 0),
-        ]
-
-        max_dot_product = 0
-        max_index = -1
-
-        for i in range(len(arm_vectors)):
-            vector_i = arm_vectors[i]
-            dot = acc_vector[0] * vector_i[0] + acc_vector[1] * vector_i[1] + acc_vector[2] * vector_i[2]
-            if dot > max_dot_product:
-                max_dot_product = dot
-                max_index = i
-
-        if max_index == -1:
-            print("Error: no max dot product")
-
-        # Light the arm pointing down, brighter at the tip
-        self.display.ARMS[max_index][7].set(255)
-        self.display.ARMS[max_index][6].set(220)
-        self.display.ARMS[max_index][5].set(180)
-        self.display.ARMS[max_index][4].set(180)
-        self.display.ARMS[max_index][3].set(160)
-        self.display.ARMS[max_index][2].set(120)
-        self.display.ARMS[max_index][1].set(120)
-        self.display.ARMS[max_index][0].set(100)
-
-class AccelActivity:
-    def __init__(self, display, accel):
-        self.__display = display
-        self.__accel = accel
-        self.__last_vector = self.__accel.lis3dh.acceleration
-        self.delay = 0.010
-
-        self.__accumulator = 0
-
-    def start(self):
-        self.__display.set_all(0)
-
-    def draw(self):
-        acc_vector = self.__accel.lis3dh.acceleration
-        jerk = math.sqrt((acc_vector[0] - self.__last_vector[0]) ** 2 + (acc_vector[1] - self.__last_vector[1]) ** 2 + (acc_vector[2] - self.__last_vector[2]) ** 2)
-        self.__last_vector = acc_vector
-
-        self.__accumulator += jerk
-        # print(jerk)
-
-        self.__display.subtract_all(1)
-        for foo in [16, 8, 4, 2, 1]:
-            if self.__accumulator > foo:
-                self.__accumulator -= foo
-                i = random.randint(0, 47)
-                self.__display.ALL[i].add(foo * 16)
-
-class AccelMarble:
-    def __init__(self, display, accel):
-        self.display = display
-        self.accel = accel
-        self.delay = 0.004
-
-        self.marble_pos = (0, 0)
-
-        self.led_positions = [
-            (0, -10), # A0
-            ()
-        ]
-
-    def start(self):
-        self.display.set_all(0)
-
-    def draw(self):
-        self.display.subtract_all(4)
-
-        acc_vector = self.accel.lis3dh.acceleration
-        print(acc_vector)
-
-        # If you hold it still in some orientation, gravity will read as follows.
-        # +Y is down (bottom arm of snowflake), -Y is up
-        # +X is left, -X is right
-        # +Z is in (toward the snowflake as you look at the front), -Z is out
-
-        force_vector = (acc_vector[0], acc_vector[1])
-
-        # We'll take the dot product with six normalized vectors pointing in the
-        # directions of the arms. Whichever is greatest is the arm that's pointing down.
-        arm_vectors = [
-            ( 0.0,   -1.0, 0),
-            (-0.866, -0.5, 0),
-            (-0.866,  0.5, 0),
-            ( 0.0,    1.0, 0),
-            ( 0.866,  0.5, 0),
-            ( 0.866, -0.5, 0),
-        ]
-
-        max_dot_product = 0
-        max_index = -1
-
-        for i in range(len(arm_vectors)):
-            vector_i = arm_vectors[i]
-            dot = acc_vector[0] * vector_i[0] + acc_vector[1] * vector_i[1] + acc_vector[2] * vector_i[2]
-            if dot > max_dot_product:
-                max_dot_product = dot
-                max_index = i
-
-        if max_index == -1:
-            print("Error: no max dot product")
-
-        # Light the arm pointing down, brighter at the tip
-        self.display.ARMS[max_index][7].set(255)
-        self.display.ARMS[max_index][6].set(220)
-        self.display.ARMS[max_index][5].set(180)
-        self.display.ARMS[max_index][4].set(180)
-        self.display.ARMS[max_index][3].set(160)
-        self.display.ARMS[max_index][2].set(120)
-        self.display.ARMS[max_index][1].set(120)
-        self.display.ARMS[max_index][0].set(100)
+        steps = self.__steps.advance(self.display.dt_us)
+        counter = self.counter
+        while steps:
+            if counter == 0:
+                self.display.set_all(255)
+                counter = 1
+                steps -= 1
+            else:
+                # Fade for the rest of the steps, or until it's time to light up again
+                n = min(steps, 500 - counter)
+                self.display.subtract_all(n)
+                counter = (counter + n) % 500
+                steps -= n
+        self.counter = counter
+
+# The rings light up one after another from the middle out, then it all fades
+STARBURST = Pattern('starburst',
+    sweep(BRIGHTEN, 'RING_A RING_B1 RING_B2 RING_C RING_D', 10, 30) + [(PAUSE, '', 0, 150)],
+    delay=0.002, decay=1)
+
+# Each LED runs through the same wave, but slightly slower than the one before,
+# so they slowly drift in and out of phase. LED i is at phase
+# (counter * 1000) // (1000 + i), which we track with a running quotient and
+# remainder instead of dividing every frame.
+_MITXELA_WAVE = bytes(min(255, v if v < 256 else (512 - v if v < 512 else 0)) for v in range(600))
 
 class MitxelaMode:
     def __init__(self, display):
         self.__display = display
         self.delay = 0.001
-        self.__counter = 0
+        self.__indexes = display.ALL.indexes
+        self.__phase = array('H', [0] * 48)
+        self.__remainder = array('H', [0] * 48)
+        self.__steps = Steps(self.delay)
 
     def start(self):
         self.__display.set_all(0)
+        self.__steps.reset()
 
     def draw(self):
-        self.__counter += 1
-        for i in range(48):
-            led = self.__display.ALL[i]
-
-            val = int((self.__counter * 1000) / (1000 + i)) % 600
-            if val < 256:
-                led.set(val)
-            elif val < 512:
-                led.set(512 - val)
-            else:
-                led.set(0)
-
-
-class SwirlMode:
-    def __init__(self, display):
-        self.__display = display
-        self.delay = 0.005
-        self.__counter = 0
-
-        self.__order = [
-            self.__display.A0,
-            self.__display.B0,
-            self.__display.C0,
-            self.__display.D0,
-            self.__display.E0,
-            self.__display.F0,
-
-            self.__display.A2,
-            self.__display.B1,
-            self.__display.B3,
-            self.__display.B2,
-            self.__display.C1,
-            self.__display.C3,
-            self.__display.C2,
-            self.__display.D1,
-            self.__display.D3,
-            self.__display.D2,
-            self.__display.E1,
-            self.__display.E3,
-            self.__display.E2,
-            self.__display.F1,
-            self.__display.F3,
-            self.__display.F2,
-            self.__display.A1,
-            self.__display.A3,
-
-            self.__display.A5,
-            self.__display.B4,
-            self.__display.B5,
-            self.__display.C4,
-            self.__display.C5,
-            self.__display.D4,
-            self.__display.D5,
-            self.__display.E4,
-            self.__display.E5,
-            self.__display.F4,
-            self.__display.F5,
-            self.__display.A4,
-
-            self.__display.A6,
-            self.__display.B6,
-            self.__display.C6,
-            self.__display.D6,
-            self.__display.E6,
-            self.__display.F6,
-
-            self.__display.A7,
-            self.__display.B7,
-            self.__display.C7,
-            self.__display.D7,
-            self.__display.E7,
-            self.__display.F7,
-        ]
-
-    def start(self):
-        self.__display.set_all(0)
-
-    def draw(self):
-        self.__display.subtract_all(1)
-
-        self.__counter += 1
-        index = (self.__counter // 20) % len(self.__order)
-        self.__order[index].set(255)
-        
-
-class LoopMode:
-    def __init__(self, display, arms=1):
-        self.__display = display
-        self.delay = 0.005
+        steps = self.__steps.advance(self.__display.dt_us)
+        if steps == 0:
+            return
+        frame = self.__display.frame
+        indexes = self.__indexes
+        phase = self.__phase
+        remainder = self.__remainder
+        if steps == 1:
+            # The usual case: each LED moves on by at most one
+            for i in range(48):
+                r = remainder[i] + 1000
+                p = phase[i]
+                if r >= 1000 + i:
+                    r -= 1000 + i
+                    p += 1
+                    if p == 600:
+                        p = 0
+                    phase[i] = p
+                remainder[i] = r
+                frame[indexes[i]] = _MITXELA_WAVE[p]
+            return
 
-        self.__counter = 0
-        self.__arms = arms
+        # Several frames' worth at once, so divide after all
+        add = 1000 * steps
+        for i in range(48):
+            d = 1000 + i
+            r = remainder[i] + add
+            q = r // d
+            p = (phase[i] + q) % 600
+            phase[i] = p
+            remainder[i] = r - q * d
+            frame[indexes[i]] = _MITXELA_WAVE[p]
+
+
+# One LED at a time spirals out from the middle, leaving a fading trail
+SWIRL = Pattern('swirl', sweep(LIGHT,
+    'A0 B0 C0 D0 E0 F0 '
+    'A2 B1 B3 B2 C1 C3 C2 D1 D3 D2 E1 E3 E2 F1 F3 F2 A1 A3 '
+    'A5 B4 B5 C4 C5 D4 D5 E4 E5 F4 F5 A4 '
+    'A6 B6 C6 D6 E6 F6 '
+    'A7 B7 C7 D7 E7 F7', 255, 20), delay=0.005, decay=1)
+
+# A dot runs out along one side of an arm and back down the other, then on to
+# the next arm anticlockwise. The 2 and 3 arm versions run that on opposite
+# arms or every other arm at once.
+_LOOP_STEPS = sweep(LIGHT, ' '.join(arm + position for arm in 'AFEDCB' for position in '014676520'), 255, 20)
+LOOP1 = Pattern('loop1', _LOOP_STEPS, delay=0.005, decay=2)
+LOOP2 = Pattern('loop2', _LOOP_STEPS, delay=0.005, decay=2, symmetry=2)
+LOOP3 = Pattern('loop3', _LOOP_STEPS, delay=0.005, decay=2, symmetry=3)
+
+
+# Random LEDs flash and fade, meant to go on top of another mode
+class SparkleMode:
+    def __init__(self, display, chance=8):
+        self.display = display
+        self.delay = 0.01
+        # Out of 256, how likely a new sparkle is each frame
+        self.chance = chance
 
     def start(self):
-        self.__counter = 0
-        self.__display.set_all(0)
+        self.display.set_all(0)
+        self.display.prepare_add(-12)
 
     def draw(self):
-        self.__display.subtract_all(2)
-
-        self.__counter += 1
-        foo = self.__counter // 20
-        step = foo % 9
-        arm_index = (foo // 9) % 6
-        if step == 0:
-            index = 0
-        elif step == 1:
-            index = 1
-        elif step == 2:
-            index = 4
-        elif step == 3:
-            index = 6
-        elif step == 4:
-            index = 7
-        elif step == 5:
-            index = 6
-        elif step == 6:
-            index = 5
-        elif step == 7:
-            index = 2
-        elif step == 8:
-            index = 0
-
-        if self.__arms == 1:
-            self.__display.ARMS[-arm_index][index].set(255)
-        elif self.__arms == 2:
-            self.__display.ARMS[-arm_index][index].set(255)
-            self.__display.ARMS[-arm_index + 3][index].set(255)
-        elif self.__arms == 3:
-            self.__display.ARMS[-arm_index][index].set(255)
-            self.__display.ARMS[-arm_index + 2][index].set(255)
-            self.__display.ARMS[-arm_index + 4][index].set(255)
-
-
+        self.display.subtract_all(12)
+        if random.getrandbits(8) < self.chance:
+            # getrandbits() is cheaper than randint(), so pick from 64 and
+            # try again if it's past the last LED
+            i = random.getrandbits(6)
+            while i >= 48:
+                i = random.getrandbits(6)
+            self.display.frame[i] = 255
 
 # Radiate out and in
 
@@ -416,56 +204,92 @@ class ShowModeMode:
         pass
 
     def draw(self):
+        frame = self.display.frame
         self.display.set_all(0)
-        self.display.RING_A[self.mode_group].set(255)
+        frame[self.display.RING_A.indexes[self.mode_group]] = 255
 
         if self.show_index:
-            self.display.RING_B1[self.mode_index].set(255)
-
+            frame[self.display.RING_B1.indexes[self.mode_index]] = 255
+
+
+# ModeSwitcher lists modes as (factory, arguments...) and only makes one when
+# it's picked, so booting is quick and modes that aren't running don't take
+# up memory. The factory is called as factory(display, arguments...). It can
+# also be a string 'module.name', which is imported the first time it's used.
+def make_mode(display, entry):
+    factory = entry[0]
+    if isinstance(factory, str):
+        module_name, name = factory.split('.')
+        factory = getattr(__import__(module_name), name)
+    return factory(display, *entry[1:])
+
+# A mode played back from frames/<name>.bin, see playback.py
+def playback(display, name, mode_class, *args):
+    return PlaybackMode(display, mode_class(display, *args), name)
+
+def swirl_sparkle(display):
+    return Compositor(display, (
+        Layer(playback(display, 'swirl', PatternMode, SWIRL)),
+        Layer(SparkleMode(display, 64), ADD),
+    ), 'swirl+sparkle')
 
 class ModeSwitcher:
-    def __init__(self, display, accel):
+    # crossfade is how many seconds a new mode takes to fade in (0 to switch
+    # straight over)
+    def __init__(self, display, accel, settings=None, crossfade=0.5):
+        self.display = display
+        if settings is None:
+            settings = Settings()
+        self.settings = settings
+        # Each mode is listed as (factory, arguments...), see make_mode()
         self.modes = [
             [
-                ConstantMode(display, 255),
-                ConstantMode(display, 128),
-                ConstantMode(display, 64),
-                ConstantMode(display, 32),
-                ConstantMode(display, 16),
-                ConstantMode(display, 14),
-                ConstantMode(display, 12),
-                ConstantMode(display, 11),
-                ConstantMode(display, 10),
-                ConstantMode(display, 9),
-                ConstantMode(display, 8),
-                ConstantMode(display, 7),
-                ConstantMode(display, 6),
-                ConstantMode(display, 5),
-                ConstantMode(display, 4),
-                ConstantMode(display, 3),
-                ConstantMode(display, 2),
-                ConstantMode(display, 1),
+                (ConstantMode, 255),
+                (ConstantMode, 128),
+                (ConstantMode, 64),
+                (ConstantMode, 32),
+                (ConstantMode, 16),
+                (ConstantMode, 14),
+                (ConstantMode, 12),
+                (ConstantMode, 11),
+                (ConstantMode, 10),
+                (ConstantMode, 9),
+                (ConstantMode, 8),
+                (ConstantMode, 7),
+                (ConstantMode, 6),
+                (ConstantMode, 5),
+                (ConstantMode, 4),
+                (ConstantMode, 3),
+                (ConstantMode, 2),
+                (ConstantMode, 1),
             ],
             [
-                FadeInMode(display, 0.01),
-                FadeInMode(display, 0.001),
-                PulseMode(display, 0.001),
-                StarburstMode(display, 0.00001),
-                MitxelaMode(display),
-                SwirlMode(display),
-                LoopMode(display, 1),
-                LoopMode(display, 2),
-                LoopMode(display, 3),
+                (playback, 'fade_in', FadeInMode, 0.01),
+                (playback, 'fade_in', FadeInMode, 0.001),
+                (PulseMode, 0.001),
+                (PatternMode, STARBURST),
+                (MitxelaMode,),
+                (playback, 'swirl', PatternMode, SWIRL),
+                (playback, 'loop1', PatternMode, LOOP1),
+                (playback, 'loop2', PatternMode, LOOP2),
+                (playback, 'loop3', PatternMode, LOOP3),
+                (swirl_sparkle,),
             ],
             [
-                AccelPlumb(display, accel),
-                AccelActivity(display, accel),
-                AccelMarble(display, accel),
+                ('accel_mode.AccelPlumb', accel),
+                ('accel_mode.AccelActivity', accel),
+                ('accel_mode.AccelMarble', accel),
             ],
             [
-                BlinkMode(display),
+                (playback, 'blink', BlinkMode),
+            ],
+            [
+                # Frames sent over USB, see stream.py
+                ('stream.StreamMode',),
             ],
         ]
+        # Only the running mode exists, see get_current_mode()
+        self.mode = None
 
         self.mode_group = 0
         self.mode_index = 0
@@ -479,28 +303,55 @@ class ModeSwitcher:
         self.show_mode_mode.mode_group = self.mode_group
         self.show_mode_mode.mode_index = self.mode_index
 
+        # While a new mode is being picked, the old one keeps running dimly
+        # underneath the mode number
+        self.__running = Layer(opacity=64)
+        self.overlay = Compositor(display, (
+            self.__running,
+            Layer(self.show_mode_mode, MAX),
+        ), 'show_mode', self.show_mode_mode.delay)
+
+        # Fades from the mode number to the new mode once it's picked
+        self.crossfade = Crossfade(display, crossfade)
 
     def get_current_mode(self):
         if self.countdown > 0:
             self.countdown -= 1
             self.show_mode_mode.show_index = (self.countdown < 150)
-            return self.show_mode_mode
+            return self.overlay
         else:
-            mode = self.modes[self.mode_group][self.mode_index]
             if self.countdown == 0:
                 self.countdown -= 1
-                mode.start()
+                # Let go of the old mode before making the new one, so they
+                # never both have to fit in memory
+                self.__running.mode = None
+                self.crossfade.mode = None
+                self.mode = None
+                # Automatic collection is off (see scheduler.py), so make
+                # room for the new mode ourselves
+                gc.collect()
+                self.mode = make_mode(self.display, self.modes[self.mode_group][self.mode_index])
+                self.__running.mode = self.mode
+                self.crossfade.mode = self.mode
+                self.crossfade.start()
 
                 # Don't save the mode if we just turned on, only if the user actually changed the mode
                 if self.first_boot:
                     self.first_boot = False
                 else:
                     self.save_mode()
-            return mode
-
-    def advance_mode_group(self):
-        self.mode_group = (self.mode_group + 1) % len(self.modes)
-        self.mode_index = 0
+            if not self.crossfade.done:
+                return self.crossfade
+            return self.mode
+
+    def __show_mode(self):
+        # Carry on from the frame the running mode last drew
+        if self.countdown < 0:
+            if self.crossfade.done:
+                self.__running.frame[:] = self.display.frame
+            else:
+                self.__running.frame[:] = self.crossfade.incoming
+                self.crossfade.done = True
         if self.countdown > 0:
             self.countdown = 100
         else:
@@ -508,23 +359,19 @@ class ModeSwitcher:
         self.show_mode_mode.mode_group = self.mode_group
         self.show_mode_mode.mode_index = self.mode_index
 
+    def advance_mode_group(self):
+        self.mode_group = (self.mode_group + 1) % len(self.modes)
+        self.mode_index = 0
+        self.__show_mode()
+
     def advance_mode(self):
         self.mode_index = (self.mode_index + 1) % len(self.modes[self.mode_group])
-        if self.countdown > 0:
-            self.countdown = 100
-        else:
-            self.countdown = 200
-        self.show_mode_mode.mode_group = self.mode_group
-        self.show_mode_mode.mode_index = self.mode_index
+        self.__show_mode()
 
 
     def load_mode(self):
-        if len(microcontroller.nvm) < 2:
-            print('No mode stored in nvm')
-            return
-
-        mode_group = microcontroller.nvm[0]
-        mode_index = microcontroller.nvm[1]
+        mode_group = self.settings.get(MODE_GROUP)
+        mode_index = self.settings.get(MODE_INDEX)
         if mode_group >= len(self.modes):
             print('Loaded mode group out of range')
             return
@@ -537,6 +384,8 @@ class ModeSwitcher:
         self.mode_index = mode_index
 
     def save_mode(self):
+        # Only changes the settings in memory; the main loop writes them to
+        # nvm between frames once they stop changing
         print('Saving mode {}, {}'.format(self.mode_group, self.mode_index))
-        microcontroller.nvm[0:2] = bytes([self.mode_group, self.mode_index])
-
+        self.settings.set(MODE_GROUP, self.mode_group)
+        self.settings.set(MODE_INDEX, self.mode_index)
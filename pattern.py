@@ -0,0 +1,190 @@
+# Sweeps around the rings and arms, written as data instead of code.
+#
+# A pattern is a list of steps that run one after another and then repeat.
+# Each step is (op, leds, value, frames):
+# * op: LIGHT sets the LEDs to value every frame, BRIGHTEN adds value to
+#   them every frame, and PAUSE leaves everything alone
+# * leds: LED names separated by spaces. A name is either one LED, like
+#   'A3', or a group from Display, like 'RING_B1' or 'ARM_C'.
+# * value: brightness, 0 to 255
+# * frames: how many frames the step lasts
+#
+# Every frame, before the step is drawn, all the LEDs fade by decay.
+# symmetry (1, 2, 3 or 6) copies each step onto that many arms, evenly spaced
+# around the snowflake, so a pattern only needs to describe one of them.
+#
+# sweep() makes one step per name, which is how most patterns start out. For
+# example
+#
+#     Pattern('inner', sweep(LIGHT, 'A0 B0 C0 D0 E0 F0', 255, 20), decay=1)
+#
+# lights each LED of the inner ring in turn, leaving a fading trail.
+#
+# Before it runs, a pattern is compiled into flat tables: an op, value and
+# length for each step, and one run of LED indexes per step. PatternMode works
+# through them with one small loop, whatever the pattern is.
+
+from array import array
+
+from display import _SATURATE, led_index
+from governor import Steps
+
+LIGHT = 0
+BRIGHTEN = 1
+PAUSE = 2
+
+def sweep(op, names, value, frames):
+    # One step for each name, in order
+    return [(op, name, value, frames) for name in names.split()]
+
+class Pattern:
+    def __init__(self, name, steps, delay=0.01, decay=0, symmetry=1):
+        if symmetry not in (1, 2, 3, 6):
+            raise ValueError('symmetry must be 1, 2, 3 or 6')
+        self.name = name
+        self.steps = steps
+        self.delay = delay
+        self.decay = decay
+        self.symmetry = symmetry
+        # Frames before it repeats
+        self.period = 0
+        for step in steps:
+            if step[3] < 1:
+                raise ValueError('Every step needs at least one frame')
+            self.period += step[3]
+
+        # Made by compile()
+        self.ops = None
+        self.values = None
+        self.frames = None
+        self.starts = None
+        self.leds = None
+
+    def __indexes(self, display, names):
+        indexes = bytearray()
+        for name in names.split():
+            try:
+                indexes.append(led_index(name))
+            except ValueError:
+                group = getattr(display, name, None)
+                if group is None or not hasattr(group, 'indexes'):
+                    raise ValueError('No LED or group called {}'.format(name))
+                indexes += group.indexes
+        return indexes
+
+    def compile(self, display):
+        # Only needs doing once, the tables are the same for every mode that
+        # uses this pattern
+        if self.leds is not None:
+            return
+
+        # Where each LED is, to turn it onto the other arms
+        arm_of = bytearray(48)
+        position_of = bytearray(48)
+        for arm in range(6):
+            indexes = display.ARMS[arm].indexes
+            for position in range(len(indexes)):
+                arm_of[indexes[position]] = arm
+                position_of[indexes[position]] = position
+        turn = 6 // self.symmetry
+
+        ops = bytearray()
+        values = bytearray()
+        frames = array('H')
+        starts = array('H', [0])
+        leds = bytearray()
+        for op, names, value, length in self.steps:
+            if op not in (LIGHT, BRIGHTEN, PAUSE):
+                raise ValueError('Unknown op {}'.format(op))
+            step_leds = bytearray()
+            for index in self.__indexes(display, names):
+                for copy in range(self.symmetry):
+                    arm = (arm_of[index] + copy * turn) % 6
+                    turned = display.ARMS[arm].indexes[position_of[index]]
+                    if turned not in step_leds:
+                        step_leds.append(turned)
+            ops.append(op)
+            values.append(value)
+            frames.append(length)
+            leds += step_leds
+            starts.append(len(leds))
+
+        self.ops = bytes(ops)
+        self.values = bytes(values)
+        self.frames = frames
+        self.starts = starts
+        self.leds = bytes(leds)
+
+class PatternMode:
+    # Runs a Pattern as a mode. It goes by display.dt_us (see governor.py),
+    # so it keeps its speed if it gets fewer frames than it asked for.
+    def __init__(self, display, pattern):
+        pattern.compile(display)
+        self.display = display
+        self.pattern = pattern
+        self.name = pattern.name
+        self.delay = pattern.delay
+        # For PlaybackMode: the frames repeat every period, and one lap first
+        # lets the fading trails build up
+        self.period = pattern.period
+        self.warmup = pattern.period
+        self.__steps = Steps(pattern.delay)
+        # The tables, kept here so draw() can get at them quickly
+        self.__ops = pattern.ops
+        self.__values = pattern.values
+        self.__frames = pattern.frames
+        self.__starts = pattern.starts
+        self.__leds = pattern.leds
+        self.__decay = pattern.decay
+        self.__step = 0
+        self.__left = pattern.frames[0]
+
+    def start(self):
+        self.display.set_all(0)
+        if self.__decay:
+            self.display.prepare_add(-self.__decay)
+        self.__steps.reset()
+        self.__step = 0
+        self.__left = self.__frames[0]
+
+    def draw(self):
+        steps = self.__steps.advance(self.display.dt_us)
+        display = self.display
+        frame = display.frame
+        step = self.__step
+        left = self.__left
+        while steps:
+            # Do up to the end of this step at once. Fading and then
+            # brightening every frame isn't the same as one big fade and
+            # one big add (the fade can't take LEDs below 0), so BRIGHTEN
+            # with a decay goes a frame at a time.
+            op = self.__ops[step]
+            n = steps if steps < left else left
+            if self.__decay:
+                if op == BRIGHTEN:
+                    n = 1
+                display.subtract_all(self.__decay * n)
+            if op == LIGHT:
+                value = self.__values[step]
+                leds = self.__leds
+                for j in range(self.__starts[step], self.__starts[step + 1]):
+                    frame[leds[j]] = value
+            elif op == BRIGHTEN:
+                amount = self.__values[step] * n
+                if amount > 255:
+                    amount = 255
+                leds = self.__leds
+                saturate = _SATURATE
+                for j in range(self.__starts[step], self.__starts[step + 1]):
+                    i = leds[j]
+                    frame[i] = saturate[frame[i] + amount]
+
+            steps -= n
+            left -= n
+            if left == 0:
+                step += 1
+                if step == len(self.__ops):
+                    step = 0
+                left = self.__frames[step]
+        self.__step = step
+        self.__left = left
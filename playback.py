@@ -0,0 +1,173 @@
+# Plays back modes that have been rendered ahead of time into a frame table.
+#
+# Modes like the swirl pattern only depend on their counter, so once they settle they
+# repeat the same sequence of frames forever. sim/render_frames.py runs them
+# on a computer and saves one loop of frames to frames/<name>.bin on the
+# CIRCUITPY drive. On the snowflake, PlaybackMode just applies the stored
+# changes to the framebuffer each frame, with no per-LED math at all.
+#
+# File format:
+# * 48 bytes: the last frame of the loop, used as the starting point.
+# * One record per frame, each describing how to get from the previous frame:
+#   a byte with the number of ops, followed by the ops.
+#   * _OP_ADD, amount: saturating add (amount is signed) to every LED.
+#   * _OP_RUN, start, count, value: set count LEDs from start to value.
+# The first record takes the last frame back around to the first, so the
+# table can loop seamlessly.
+
+import gc
+
+from governor import Steps
+
+_OP_ADD = 1
+_OP_RUN = 2
+
+FRAMES_DIR = 'frames'
+
+def frames_path(name):
+    return '{}/{}.bin'.format(FRAMES_DIR, name)
+
+def render(display, mode, count, warmup=0):
+    # Run a mode against the framebuffer without presenting it, and collect
+    # count frames after letting it settle for warmup frames.
+    saved = bytes(display.frame)
+    display.set_all(0)
+    mode.start()
+    for _ in range(warmup):
+        mode.draw()
+    frames = []
+    for _ in range(count):
+        mode.draw()
+        frames.append(bytes(display.frame))
+    display.frame[:] = saved
+    return frames
+
+def _runs(base, frame):
+    ops = bytearray()
+    count = 0
+    i = 0
+    while i < 48:
+        if base[i] == frame[i]:
+            i += 1
+            continue
+        value = frame[i]
+        start = i
+        while i < 48 and frame[i] == value:
+            i += 1
+        ops += bytes((_OP_RUN, start, i - start, value))
+        count += 1
+    return count, ops
+
+def _encode_frame(prev, frame):
+    count, ops = _runs(prev, frame)
+
+    # Most animations fade everything by the same amount each frame, so try
+    # describing the frame as one whole-frame add plus a few corrections.
+    deltas = {}
+    for i in range(48):
+        delta = frame[i] - prev[i]
+        if delta != 0 and -128 <= delta <= 127:
+            deltas[delta] = deltas.get(delta, 0) + 1
+    if deltas:
+        amount = max(deltas, key=deltas.get)
+        base = bytes(min(255, max(0, v + amount)) for v in prev)
+        add_count, add_ops = _runs(base, frame)
+        if len(add_ops) + 2 < len(ops):
+            count = add_count + 1
+            ops = bytes((_OP_ADD, amount & 0xFF)) + add_ops
+
+    return bytes((count,)) + ops
+
+def encode(frames):
+    data = bytearray(frames[-1])
+    prev = frames[-1]
+    for frame in frames:
+        data += _encode_frame(prev, frame)
+        prev = frame
+    return bytes(data)
+
+class PlaybackMode:
+    # Wraps a mode which has a period (and optionally a warmup) attribute.
+    # If frames/<name>.bin is missing the wrapped mode just runs live.
+    def __init__(self, display, mode, name):
+        self.display = display
+        self.mode = mode
+        self.name = name
+        self.delay = mode.delay
+        self.data = None
+        self.pos = 0
+        self.__steps = Steps(mode.delay)
+
+    def load(self):
+        # The tables can be 16 KB, which needs to fit in one piece, and
+        # automatic collection is off (see scheduler.py)
+        gc.collect()
+        try:
+            with open(frames_path(self.name), 'rb') as f:
+                self.data = f.read()
+        except OSError:
+            print('No frames for {}, running it live'.format(self.name))
+            self.data = b''
+            return
+
+        # Make the tables for the adds in it now rather than while drawing
+        data = self.data
+        pos = 48
+        while pos < len(data):
+            ops = data[pos]
+            pos += 1
+            while ops:
+                if data[pos] == _OP_ADD:
+                    amount = data[pos + 1]
+                    if amount > 127:
+                        amount -= 256
+                    self.display.prepare_add(amount)
+                    pos += 2
+                else:
+                    pos += 4
+                ops -= 1
+
+    def start(self):
+        if self.data is None:
+            self.load()
+        self.__steps.reset()
+        if self.data:
+            self.display.frame[:] = self.data[0:48]
+            self.pos = 48
+        else:
+            self.mode.start()
+
+    def draw(self):
+        data = self.data
+        if not data:
+            self.mode.draw()
+            return
+
+        # The table has one record per frame at the wrapped mode's delay, so
+        # play as many as have passed to keep the speed
+        steps = self.__steps.advance(self.display.dt_us)
+
+        frame = self.display.frame
+        pos = self.pos
+        while steps:
+            ops = data[pos]
+            pos += 1
+            while ops:
+                if data[pos] == _OP_ADD:
+                    amount = data[pos + 1]
+                    if amount > 127:
+                        amount -= 256
+                    self.display.add_all(amount)
+                    pos += 2
+                else:
+                    start = data[pos + 1]
+                    value = data[pos + 3]
+                    for i in range(start, start + data[pos + 2]):
+                        frame[i] = value
+                    pos += 4
+                ops -= 1
+
+            if pos >= len(data):
+                pos = 48
+            steps -= 1
+        self.pos = pos
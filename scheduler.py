@@ -0,0 +1,189 @@
+import gc
+import time
+
+import supervisor
+
+from telemetry import MEM_CHECK_FRAMES
+
+# What to do when a frame takes longer than the mode's delay.
+# DROP skips the frames we've missed and carries on from now, so the
+# animation slows down but never rushes.
+# CATCH_UP draws the missed frames back to back (up to max_behind of them)
+# so the animation keeps its average speed.
+DROP = 0
+CATCH_UP = 1
+
+# Times are kept as nanoseconds since a base time, which moves forward every
+# REBASE_NS so they stay small integers. On CircuitPython anything past 2^30
+# becomes a long integer, which has to be allocated.
+REBASE_NS = 1 << 28
+
+# time.sleep() takes seconds, and working those out would make a new float
+# every frame, so keep one for every whole number of milliseconds
+MAX_SLEEP_MS = 20
+_SLEEP_SECONDS = tuple(ms / 1000 for ms in range(MAX_SLEEP_MS + 1))
+
+# supervisor.ticks_ms() wraps around at 2^29, so differences are masked
+_TICKS_MASK = (1 << 29) - 1
+_TICKS_HALF = 1 << 28
+
+class FrameScheduler:
+    # Keeps frames on a fixed timetable using absolute deadlines in integer
+    # nanoseconds, so the timing doesn't drift and doesn't lose precision as
+    # the uptime grows (unlike time.monotonic(), which is a float).
+    #
+    # poll is called every input_period seconds while we wait, however long
+    # the mode's frames are, so the buttons stay responsive. It can be None
+    # if something else takes care of input, as in async_runtime.py.
+    #
+    # Automatic garbage collection is turned off, so it can't kick in halfway
+    # through a draw(). Instead, once free memory drops below collect_below
+    # bytes, we collect between frames, in the time we'd otherwise sleep.
+    # gc.mem_free() has to scan the heap, so that's only checked every
+    # MEM_CHECK_FRAMES frames.
+    #
+    # With automatic collection off, CircuitPython doesn't collect by itself
+    # even when memory runs out: an allocation that doesn't fit raises
+    # MemoryError. So code that allocates a lot at once (making a mode,
+    # loading its frames) calls gc.collect() first.
+    #
+    # idle, if given, is called once per frame at the same point, for slow
+    # housekeeping like saving settings that mustn't happen mid-frame.
+    def __init__(self, poll, input_period=0.005, policy=DROP, max_behind=4, collect_below=16384, idle=None):
+        self.poll = poll
+        self.idle = idle
+        self.input_period_ns = int(input_period * 1000000000)
+        self.policy = policy
+        self.max_behind = max_behind
+
+        self.overruns = 0
+        self.dropped = 0
+        self.collections = 0
+        # How long the last frame took, from the end of one wait() to the
+        # start of the next
+        self.busy_ns = 0
+
+        # CPython (the simulator) doesn't have gc.mem_free(), so leave it alone there
+        self.__mem_free = getattr(gc, 'mem_free', None)
+        self.collect_below = collect_below
+        if self.__mem_free is not None and collect_below:
+            gc.disable()
+        self.__mem_countdown = 0
+
+        self.__delay = None
+        self.__period_ns = 0
+        self.__base = time.monotonic_ns()
+        self.deadline = 0
+        self.frame_start = 0
+        # Time from the start of the previous frame to the start of this one
+        self.frame_ns = 0
+        self.next_input = self.input_period_ns
+
+    def now(self):
+        return time.monotonic_ns() - self.__base
+
+    def __rebase(self):
+        shift = self.frame_start
+        self.__base += shift
+        self.deadline -= shift
+        self.next_input -= shift
+        self.frame_start = 0
+
+    def period_ns(self, delay):
+        # Only convert the float delay when the mode changes
+        if delay is not self.__delay:
+            self.__delay = delay
+            self.__period_ns = int(delay * 1000000000)
+        return self.__period_ns
+
+    def end_frame(self, delay):
+        # Call once per frame, after drawing. Moves the deadline on, deals
+        # with overruns and does the between-frame housekeeping, and returns
+        # how much time is left before the next frame (negative if we
+        # overran).
+        period = self.period_ns(delay)
+        self.deadline += period
+
+        now = self.now()
+        self.busy_ns = now - self.frame_start
+        slack = self.deadline - now
+        if slack < 0:
+            self.overruns += 1
+            behind = -slack // period if period else 0
+            if self.policy == DROP or behind >= self.max_behind:
+                self.dropped += behind
+                self.deadline = now
+
+        if self.__mem_free is not None and self.collect_below:
+            self.__mem_countdown -= 1
+            if self.__mem_countdown <= 0:
+                self.__mem_countdown = MEM_CHECK_FRAMES
+                if self.__mem_free() < self.collect_below:
+                    gc.collect()
+                    self.collections += 1
+
+        if self.idle is not None:
+            self.idle()
+        return slack
+
+    def start_frame(self):
+        # Call when the next frame is due, before drawing it
+        now = self.now()
+        self.frame_ns = now - self.frame_start
+        self.frame_start = now
+        if now > REBASE_NS:
+            self.__rebase()
+
+    def resume(self):
+        # Call after sleeping between frames (see sleeper.py), so the time
+        # asleep isn't counted as the next frame running late
+        now = self.now()
+        self.deadline = now
+        self.next_input = now
+        self.frame_ns = 0
+        self.frame_start = now
+        if now > REBASE_NS:
+            self.__rebase()
+
+    def wait(self, delay):
+        # end_frame(), then sleep until the next frame is due, polling input
+        # meanwhile, then start_frame(). Returns end_frame()'s slack.
+        slack = self.end_frame(delay)
+
+        now = self.now()
+        while True:
+            if now >= self.next_input:
+                if self.poll is not None:
+                    self.poll()
+                self.next_input += self.input_period_ns
+                if self.next_input <= now:
+                    self.next_input = now + self.input_period_ns
+            if now >= self.deadline:
+                break
+
+            wake = self.deadline
+            if self.next_input < wake:
+                wake = self.next_input
+            # time.sleep() lets the CPU idle until the next tick, but only
+            # has millisecond resolution, so spin for anything shorter
+            sleep_ms = (wake - now) // 1000000
+            if sleep_ms > 0:
+                if sleep_ms > MAX_SLEEP_MS:
+                    sleep_ms = MAX_SLEEP_MS
+                time.sleep(_SLEEP_SECONDS[sleep_ms])
+                now = self.now()
+            else:
+                # Every read of time.monotonic_ns() makes a long integer, so
+                # spin on supervisor.ticks_ms() (a small one) instead, for
+                # wake rounded to the nearest millisecond, then read the clock
+                # just once. ticks_ms() doesn't count from the same time as
+                # monotonic_ns(), so only go by how far it moves.
+                wake_ms = (supervisor.ticks_ms() + (wake - now + 500000) // 1000000) & _TICKS_MASK
+                while 0 < (wake_ms - supervisor.ticks_ms()) & _TICKS_MASK < _TICKS_HALF:
+                    pass
+                now = self.now()
+                if now < wake:
+                    now = wake
+
+        self.start_frame()
+        return slack
@@ -0,0 +1,110 @@
+# Settings that survive turning the snowflake off, kept in microcontroller.nvm.
+#
+# Writing to nvm is slow (it's flash memory), and every write wears it a
+# little. So changes are only kept in RAM at first, and flush() writes them
+# once they've stopped changing for FLUSH_FRAMES frames. The main loop calls
+# it between frames, so a write never happens halfway through drawing one.
+#
+# Rather than rewriting the same bytes every time, each save is appended as a
+# new record to a ring of records across the whole nvm area:
+# * MAGIC
+# * a sequence number (2 bytes, little endian), one more than the last save
+# * the values (VALUES bytes)
+# * a checksum of all the bytes before it
+# When loading, the valid record with the newest sequence number wins, so a
+# half-written record (if the power goes mid-write) is just ignored.
+
+import microcontroller
+
+MAGIC = 0xA5
+VALUES = 12
+RECORD_SIZE = VALUES + 4
+
+# What each value is for. Modes can use the rest, from FIRST_PARAM on.
+MODE_GROUP = 0
+MODE_INDEX = 1
+FIRST_PARAM = 2
+
+FLUSH_FRAMES = 100
+
+def _checksum(record):
+    total = 0x5A
+    for i in range(RECORD_SIZE - 1):
+        total += record[i]
+    return total & 0xFF
+
+class Settings:
+    def __init__(self, nvm=None):
+        if nvm is None:
+            nvm = microcontroller.nvm
+        self.nvm = nvm
+        self.slots = len(nvm) // RECORD_SIZE
+        self.values = bytearray(VALUES)
+        # Where the newest record is, and its sequence number
+        self.slot = -1
+        self.sequence = 0
+        # Frames since the last change, or -1 if everything is saved
+        self.__unsaved = -1
+        self.__record = bytearray(RECORD_SIZE)
+        self.load()
+
+    def load(self):
+        nvm = self.nvm
+        record = self.__record
+        found = False
+        for slot in range(self.slots):
+            start = slot * RECORD_SIZE
+            record[:] = nvm[start:start + RECORD_SIZE]
+            if record[0] != MAGIC or record[-1] != _checksum(record):
+                continue
+            sequence = record[1] | (record[2] << 8)
+            # Sequence numbers wrap around, so newer means less than half
+            # the range ahead
+            if not found or 0 < (sequence - self.sequence) & 0xFFFF < 0x8000:
+                found = True
+                self.slot = slot
+                self.sequence = sequence
+                self.values[:] = record[3:3 + VALUES]
+
+        if not found and len(nvm) >= 2:
+            # Older versions kept just the mode in the first two bytes
+            self.values[MODE_GROUP] = nvm[0]
+            self.values[MODE_INDEX] = nvm[1]
+        return found
+
+    def get(self, key):
+        return self.values[key]
+
+    def set(self, key, value):
+        if self.values[key] != value:
+            self.values[key] = value
+            self.__unsaved = 0
+
+    @property
+    def unsaved(self):
+        return self.__unsaved >= 0
+
+    def flush(self, force=False):
+        # Call once per frame. Writes the values once they've settled, or
+        # straight away with force. Returns True if it wrote anything.
+        if self.__unsaved < 0:
+            return False
+        if not force and self.__unsaved < FLUSH_FRAMES:
+            self.__unsaved += 1
+            return False
+        if self.slots == 0:
+            self.__unsaved = -1
+            return False
+
+        self.slot = (self.slot + 1) % self.slots
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        record = self.__record
+        record[0] = MAGIC
+        record[1] = self.sequence & 0xFF
+        record[2] = self.sequence >> 8
+        record[3:3 + VALUES] = self.values
+        record[-1] = _checksum(record)
+        start = self.slot * RECORD_SIZE
+        self.nvm[start:start + RECORD_SIZE] = record
+        self.__unsaved = -1
+        return True
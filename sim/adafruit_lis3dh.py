@@ -0,0 +1,163 @@
+# Host-side stand-in for the adafruit_lis3dh library and the LIS3DH itself.
+#
+# Readings come from the accelerometer trace in simulator. The registers the
+# snowflake code uses for the FIFO are emulated: samples pile up at the data
+# rate in virtual time, INT1 goes high past the FIFO watermark, and a burst
+# read of the output registers pops them. INT1 can also be set to go high on
+# movement, measured from the reading when REFERENCE was last read.
+
+import struct
+
+import simulator
+
+RANGE_2_G = 0
+RANGE_4_G = 1
+RANGE_8_G = 2
+RANGE_16_G = 3
+
+DATARATE_1344_HZ = 0b1001
+DATARATE_400_HZ = 0b0111
+DATARATE_200_HZ = 0b0110
+DATARATE_100_HZ = 0b0101
+DATARATE_50_HZ = 0b0100
+DATARATE_25_HZ = 0b0011
+DATARATE_10_HZ = 0b0010
+DATARATE_1_HZ = 0b0001
+DATARATE_POWERDOWN = 0
+
+STANDARD_GRAVITY = 9.806
+
+_RATES = {
+    DATARATE_1344_HZ: 1344,
+    DATARATE_400_HZ: 400,
+    DATARATE_200_HZ: 200,
+    DATARATE_100_HZ: 100,
+    DATARATE_50_HZ: 50,
+    DATARATE_25_HZ: 25,
+    DATARATE_10_HZ: 10,
+    DATARATE_1_HZ: 1,
+}
+
+_DIVIDERS = {RANGE_2_G: 16380, RANGE_4_G: 8190, RANGE_8_G: 4096, RANGE_16_G: 1365}
+
+_REG_CTRL3 = 0x22
+_REG_CTRL5 = 0x24
+_REG_REFERENCE = 0x26
+_REG_FIFO_CTRL = 0x2E
+_REG_FIFO_SRC = 0x2F
+_REG_OUT_X_L = 0x28
+_REG_INT1_CFG = 0x30
+_REG_INT1_SRC = 0x31
+_REG_INT1_THS = 0x32
+
+# INT1_THS step in mg for each range
+_THRESHOLD_MG = {RANGE_2_G: 16, RANGE_4_G: 32, RANGE_8_G: 62, RANGE_16_G: 186}
+
+_FIFO_DEPTH = 32
+
+class _I2CDevice:
+    def __init__(self, sensor):
+        self.sensor = sensor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write_then_readinto(self, out_buffer, in_buffer, out_start=0, out_end=None, in_start=0, in_end=None):
+        if in_end is None:
+            in_end = len(in_buffer)
+        register = out_buffer[out_start] & 0x7F
+        in_buffer[in_start:in_end] = self.sensor._read_block(register, in_end - in_start)
+
+class LIS3DH_I2C:
+    def __init__(self, i2c, address=0x18, int1=None, int2=None):
+        self.address = address
+        self._i2c = _I2CDevice(self)
+        self.range = RANGE_2_G
+        self.data_rate = DATARATE_400_HZ
+        self.registers = bytearray(0x40)
+        self.fifo = []
+        self.next_sample_ns = simulator.clock.now_ns
+        self.reference = (0, 0, 0)
+        if int1 is not None:
+            simulator.pin_levels[int1.pin.name] = self._int1
+        if int2 is not None:
+            simulator.pin_levels[int2.pin.name] = lambda: False
+
+    @property
+    def acceleration(self):
+        return simulator.acceleration()
+
+    def _raw(self, at_ns):
+        divider = _DIVIDERS[self.range]
+        return tuple(max(-32768, min(32767, round(a / STANDARD_GRAVITY * divider)))
+                     for a in simulator.acceleration(at_ns))
+
+    def _fifo_enabled(self):
+        return self.registers[_REG_CTRL5] & 0x40 and self.registers[_REG_FIFO_CTRL] & 0xC0
+
+    def _fill(self):
+        rate = _RATES.get(self.data_rate)
+        now = simulator.clock.now_ns
+        if not rate or not self._fifo_enabled():
+            self.next_sample_ns = now
+            return
+        period = 1000000000 // rate
+        while self.next_sample_ns <= now:
+            self.fifo.append(self._raw(self.next_sample_ns))
+            self.next_sample_ns += period
+        # Stream mode throws away the oldest samples once the FIFO is full
+        overflow = len(self.fifo) - _FIFO_DEPTH
+        if overflow > 0:
+            del self.fifo[:overflow]
+
+    def _watermark(self):
+        return len(self.fifo) > self.registers[_REG_FIFO_CTRL] & 0x1F
+
+    def _moved(self):
+        # Like INT1_CFG's high events on each axis, with the high-pass filter
+        # taken as the difference from the reference reading
+        config = self.registers[_REG_INT1_CFG]
+        threshold = self.registers[_REG_INT1_THS] * _THRESHOLD_MG[self.range] * _DIVIDERS[self.range] // 1000
+        reading = self._raw(simulator.clock.now_ns)
+        for axis in range(3):
+            if config & (0x02 << (axis * 2)) and abs(reading[axis] - self.reference[axis]) > threshold:
+                return True
+        return False
+
+    def _int1(self):
+        self._fill()
+        control = self.registers[_REG_CTRL3]
+        if control & 0x40 and self._moved():
+            return True
+        return bool(control & 0x04 and self._watermark())
+
+    def _read_register_byte(self, register):
+        if register == _REG_FIFO_SRC:
+            self._fill()
+            count = len(self.fifo)
+            return ((0x80 if self._watermark() else 0) | (0x40 if count >= _FIFO_DEPTH else 0)
+                    | (0x20 if count == 0 else 0) | min(count, 0x1F))
+        if register == _REG_REFERENCE:
+            self.reference = self._raw(simulator.clock.now_ns)
+        elif register == _REG_INT1_SRC:
+            return 0x40 if self._moved() else 0
+        return self.registers[register]
+
+    def _write_register_byte(self, register, value):
+        self.registers[register] = value
+
+    def _read_block(self, register, length):
+        if register != _REG_OUT_X_L:
+            return bytes(self.registers[register:register + length])
+        self._fill()
+        data = bytearray()
+        for _ in range(length // 6):
+            if self.fifo:
+                sample = self.fifo.pop(0)
+            else:
+                sample = self._raw(simulator.clock.now_ns)
+            data += struct.pack('<hhh', *sample)
+        return bytes(data)
@@ -0,0 +1,23 @@
+# Host-side stand-in for CircuitPython's alarm module, just light sleep with
+# pin and time alarms. Sleeping moves the virtual clock on a millisecond at a
+# time until one of the alarms goes off.
+
+from alarm import pin, time
+
+import simulator
+
+# The alarm that ended the last sleep
+wake_alarm = None
+
+_STEP_NS = 1000000
+
+def light_sleep_until_alarms(*alarms):
+    global wake_alarm
+    if not alarms:
+        raise ValueError('No alarms set')
+    while True:
+        for each in alarms:
+            if each._triggered():
+                wake_alarm = each
+                return each
+        simulator.clock.advance(_STEP_NS)
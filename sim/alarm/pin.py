@@ -0,0 +1,14 @@
+# Host-side stand-in for alarm.pin
+
+from digitalio import DigitalInOut
+
+class PinAlarm:
+    def __init__(self, pin, value, edge=False, pull=False):
+        self.pin = pin
+        self.value = value
+        self.edge = edge
+        self.pull = pull
+        self.__input = DigitalInOut(pin)
+
+    def _triggered(self):
+        return self.__input.value == self.value
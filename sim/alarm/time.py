@@ -0,0 +1,12 @@
+# Host-side stand-in for alarm.time
+
+import simulator
+
+class TimeAlarm:
+    def __init__(self, *, monotonic_time=None, epoch_time=None):
+        if monotonic_time is None:
+            raise ValueError('monotonic_time is required')
+        self.monotonic_time = monotonic_time
+
+    def _triggered(self):
+        return simulator.clock.now_ns >= int(self.monotonic_time * 1000000000)
@@ -0,0 +1,109 @@
+# Host-side stand-in for CircuitPython's asyncio library, just the parts the
+# snowflake uses (run, create_task, gather, sleep, sleep_ms and Event), on the
+# simulator's virtual clock. Tasks run one at a time in the order they're due,
+# and the clock jumps straight to the next one, so a run is repeatable and
+# doesn't take real time.
+
+import heapq
+
+import simulator
+
+class _Sleep:
+    def __init__(self, ms):
+        self.ms = ms
+
+    def __await__(self):
+        yield self
+
+class _Wait:
+    def __init__(self, event):
+        self.event = event
+
+    def __await__(self):
+        if not self.event.is_set():
+            yield self
+
+def sleep_ms(ms):
+    return _Sleep(max(0, int(ms)))
+
+def sleep(seconds):
+    return sleep_ms(seconds * 1000)
+
+class Event:
+    def __init__(self):
+        self.__set = False
+        self._waiting = []
+
+    def is_set(self):
+        return self.__set
+
+    def set(self):
+        self.__set = True
+        for task in self._waiting:
+            _loop.schedule(task, simulator.clock.now_ns)
+        del self._waiting[:]
+
+    def clear(self):
+        self.__set = False
+
+    def wait(self):
+        return _Wait(self)
+
+class Task:
+    def __init__(self, coro):
+        self.coro = coro
+        self.done = False
+        self.result = None
+        self.waiting = []
+
+    def __await__(self):
+        if not self.done:
+            yield self
+        return self.result
+
+class _Loop:
+    def __init__(self):
+        self.queue = []
+        self.count = 0
+
+    def schedule(self, task, at_ns):
+        # count keeps tasks due at the same time in the order they came
+        self.count += 1
+        heapq.heappush(self.queue, (at_ns, self.count, task))
+
+    def run_until(self, main):
+        while not main.done:
+            at_ns, _, task = heapq.heappop(self.queue)
+            if at_ns > simulator.clock.now_ns:
+                simulator.clock.advance(at_ns - simulator.clock.now_ns)
+            try:
+                request = task.coro.send(None)
+            except StopIteration as stop:
+                task.done = True
+                task.result = stop.value
+                for waiting in task.waiting:
+                    self.schedule(waiting, simulator.clock.now_ns)
+                continue
+            if isinstance(request, _Sleep):
+                self.schedule(task, simulator.clock.now_ns + request.ms * 1000000)
+            elif isinstance(request, _Wait):
+                request.event._waiting.append(task)
+            elif isinstance(request, Task):
+                request.waiting.append(task)
+        return main.result
+
+_loop = _Loop()
+
+def create_task(coro):
+    task = Task(coro)
+    _loop.schedule(task, simulator.clock.now_ns)
+    return task
+
+async def gather(*awaitables):
+    results = []
+    for awaitable in awaitables:
+        results.append(await awaitable)
+    return results
+
+def run(coro):
+    return _loop.run_until(create_task(coro))
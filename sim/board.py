@@ -0,0 +1,32 @@
+# Host-side stand-in for CircuitPython's board module on the snowflake.
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return 'board.{}'.format(self.name)
+
+MODE_L = Pin('MODE_L')
+MODE_R = Pin('MODE_R')
+INT1 = Pin('INT1')
+SCL = Pin('SCL')
+SDA = Pin('SDA')
+
+class _I2C:
+    def try_lock(self):
+        return True
+
+    def unlock(self):
+        pass
+
+    def deinit(self):
+        pass
+
+_i2c = None
+
+def I2C():
+    global _i2c
+    if _i2c is None:
+        _i2c = _I2C()
+    return _i2c
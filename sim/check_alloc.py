@@ -0,0 +1,134 @@
+# Checks that code.py doesn't allocate memory once a mode is running.
+#
+#     python3 sim/check_alloc.py
+#
+# It boots code.py in the simulator, then for every mode in ModeSwitcher:
+# * runs draw() and present() under tracemalloc and records the most memory
+#   any single frame allocated
+# * runs whole frames of the main loop (run_frame(): draw, present, wait,
+#   input, telemetry) and checks nothing is left behind afterwards
+#
+# CPython allocates in places CircuitPython doesn't (ints above 256, range()
+# iterators, the temporary copy when a bytearray slice is assigned), so a
+# frame never measures zero here. We measure that floor with a mode that only
+# clears the frame and allow each mode BUDGET bytes above it: enough for a
+# range() loop, but less than a tuple of floats, a list of a few items or a
+# formatted string, so those fail the check. The simulator's own stand-ins
+# (the LIS3DH FIFO, the buttons) allocate while the loop waits, so the
+# whole-loop check only counts memory still held by the snowflake's code
+# afterwards.
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tracemalloc
+
+import simulator
+
+BUDGET = 96
+
+_SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+_FILTERS = (
+    tracemalloc.Filter(True, os.path.join(os.path.dirname(_SIM_DIR), '*.py')),
+    tracemalloc.Filter(False, os.path.join(_SIM_DIR, '*')),
+)
+
+# Counters that pass 256 get a new int object, which is fine, so the
+# whole-loop check counts blocks: a leak leaves one behind every frame
+RETAINED_BLOCKS = 8
+
+class _IdleMode:
+    def __init__(self, display):
+        self.display = display
+        self.delay = 0.01
+
+    def start(self):
+        pass
+
+    def draw(self):
+        self.display.set_all(0)
+
+def _in_use():
+    # Blocks allocated by the snowflake's own modules, not the simulator
+    snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+    return sum(stat.count for stat in snapshot.statistics('filename'))
+
+def _select(switcher, group, index):
+    switcher.mode_group = group
+    switcher.mode_index = index
+    switcher.countdown = 0
+
+def measure(namespace, group, index, frames, warmup):
+    # Returns the most a single draw allocated, and how many more blocks were
+    # in use after the whole-loop frames than before them
+    run_frame = namespace['run_frame']
+    display = namespace['display']
+    switcher = namespace['mode_switcher']
+    _select(switcher, group, index)
+    for _ in range(warmup):
+        run_frame()
+    mode = switcher.get_current_mode()
+
+    worst = 0
+    tracemalloc.start()
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        mode.draw()
+        display.present()
+        peak = tracemalloc.get_traced_memory()[1] - before
+        if peak > worst:
+            worst = peak
+
+    # Objects made before tracemalloc started aren't counted, so let the
+    # loop replace the ones it keeps (times, counters) before the baseline
+    for _ in range(10):
+        run_frame()
+    before = _in_use()
+    for _ in range(frames):
+        run_frame()
+    retained = _in_use() - before
+    tracemalloc.stop()
+    return worst, retained
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the main loop for allocations')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=300)
+    parser.add_argument('--budget', type=int, default=BUDGET)
+    args = parser.parse_args()
+
+    # Modes and the loading messages print; keep that out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        namespace = simulator.run(3)
+        # Static modes would sleep until a button is pressed, which never
+        # happens here, so just carry on drawing instead
+        namespace['sleeper'].until_input = lambda idle=None: None
+        switcher = namespace['mode_switcher']
+        switcher.modes.append([(_IdleMode,)])
+        floor = measure(namespace, len(switcher.modes) - 1, 0, args.frames, args.warmup)[0]
+        switcher.modes.pop()
+
+        from telemetry import mode_name
+        results = []
+        for group in range(len(switcher.modes)):
+            for index in range(len(switcher.modes[group])):
+                worst, retained = measure(namespace, group, index, args.frames, args.warmup)
+                results.append(('{}.{}'.format(group, index), mode_name(switcher.mode), worst, retained))
+
+    print('Floor: {} bytes per frame'.format(floor))
+    print('mode  name                     draw  blocks')
+    failed = 0
+    for key, name, worst, retained in results:
+        extra = worst - floor
+        status = 'ok'
+        if extra > args.budget or retained > RETAINED_BLOCKS:
+            status = 'ALLOCATES'
+            failed += 1
+        print('{:5} {:24} {:5} {:7} {}'.format(key, name, max(extra, 0), retained, status))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
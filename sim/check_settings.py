@@ -0,0 +1,139 @@
+# Checks that settings.py finds the right record in nvm.
+#
+#     python3 sim/check_settings.py
+#
+# Every check runs Settings against a bytearray standing in for
+# microcontroller.nvm: saving and loading back the newest record, going
+# round the ring, skipping records with a bad checksum or a half-written
+# start, sequence numbers wrapping around at 0xFFFF, and falling back to the
+# old two-byte layout. If any of these break, snowflakes forget their mode
+# when they're updated.
+
+import sys
+
+import simulator
+
+simulator.install()
+from settings import MODE_GROUP, MODE_INDEX, RECORD_SIZE, Settings
+
+NVM_SIZE = 256
+
+def _blank():
+    # Erased flash reads as 0xFF
+    return bytearray(b'\xff' * NVM_SIZE)
+
+def _save(settings, group, index):
+    settings.set(MODE_GROUP, group)
+    settings.set(MODE_INDEX, index)
+    settings.flush(True)
+
+def _mode(settings):
+    return settings.get(MODE_GROUP), settings.get(MODE_INDEX)
+
+def check_round_trip():
+    nvm = _blank()
+    settings = Settings(nvm)
+    _save(settings, 3, 1)
+    _save(settings, 2, 4)
+    loaded = Settings(nvm)
+    if _mode(loaded) != (2, 4):
+        return 'loaded {}, expected (2, 4)'.format(_mode(loaded))
+    if (loaded.slot, loaded.sequence) != (settings.slot, settings.sequence):
+        return 'newest record is slot {} sequence {}, expected slot {} sequence {}'.format(
+            loaded.slot, loaded.sequence, settings.slot, settings.sequence)
+
+def check_ring():
+    # Enough saves to go round the ring twice, so the newest record is in
+    # an early slot with older ones after it
+    nvm = _blank()
+    settings = Settings(nvm)
+    saves = settings.slots * 2 + 3
+    for n in range(saves):
+        _save(settings, n % 5, n % 7)
+    if settings.slot != (saves - 1) % settings.slots:
+        return 'wrote slot {}, expected {}'.format(settings.slot, (saves - 1) % settings.slots)
+    loaded = Settings(nvm)
+    expected = ((saves - 1) % 5, (saves - 1) % 7)
+    if _mode(loaded) != expected:
+        return 'loaded {}, expected {}'.format(_mode(loaded), expected)
+
+    # Saving again carries on from where it left off
+    _save(loaded, 1, 1)
+    if loaded.slot != saves % settings.slots:
+        return 'saved to slot {} after loading, expected {}'.format(loaded.slot, saves % settings.slots)
+
+def check_bad_checksum():
+    nvm = _blank()
+    settings = Settings(nvm)
+    _save(settings, 3, 1)
+    _save(settings, 2, 4)
+    nvm[settings.slot * RECORD_SIZE + RECORD_SIZE - 1] ^= 0xFF
+    loaded = Settings(nvm)
+    if _mode(loaded) != (3, 1):
+        return 'loaded {}, expected the older record (3, 1)'.format(_mode(loaded))
+
+def check_half_written():
+    # The power went off after the values but before the start of the
+    # record was written, so it still has erased bytes
+    nvm = _blank()
+    settings = Settings(nvm)
+    _save(settings, 3, 1)
+    _save(settings, 2, 4)
+    nvm[settings.slot * RECORD_SIZE] = 0xFF
+    loaded = Settings(nvm)
+    if _mode(loaded) != (3, 1):
+        return 'loaded {}, expected the older record (3, 1)'.format(_mode(loaded))
+
+def check_sequence_wrap():
+    nvm = _blank()
+    settings = Settings(nvm)
+    # Wrap at the end of the ring too, so the newest record (sequence 1) is
+    # read before the oldest ones (0xFFFE and 0xFFFF) after it
+    settings.slot = settings.slots - 3
+    settings.sequence = 0xFFFD
+    for n in range(4):
+        _save(settings, n, n)
+    if settings.sequence != 1:
+        return 'sequence went to {}, expected 1'.format(settings.sequence)
+    loaded = Settings(nvm)
+    if _mode(loaded) != (3, 3) or loaded.sequence != 1:
+        return 'loaded {} with sequence {}, expected (3, 3) with 1'.format(_mode(loaded), loaded.sequence)
+
+def check_old_layout():
+    nvm = _blank()
+    nvm[0] = 2
+    nvm[1] = 5
+    loaded = Settings(nvm)
+    if loaded.load():
+        return 'found a record in the old layout'
+    if _mode(loaded) != (2, 5):
+        return 'loaded {}, expected (2, 5)'.format(_mode(loaded))
+
+    # The first save turns it into the new layout
+    _save(loaded, 2, 5)
+    if _mode(Settings(nvm)) != (2, 5):
+        return 'lost the mode when saving over the old layout'
+
+CHECKS = (
+    check_round_trip,
+    check_ring,
+    check_bad_checksum,
+    check_half_written,
+    check_sequence_wrap,
+    check_old_layout,
+)
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        problem = check()
+        name = check.__name__[len('check_'):]
+        if problem is None:
+            print('{:16} ok'.format(name))
+        else:
+            print('{:16} FAILED: {}'.format(name, problem))
+            failed += 1
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# Checks that StreamMode (stream.py) decodes packets and counts problems
+# correctly.
+#
+#     python3 sim/check_stream.py
+#
+# Every check sends hand-built packets to a fresh StreamMode through the
+# simulator's usb_cdc.data, then looks at the frame it shows and its frames,
+# dropped, replaced and errors counters. Between them they cover 0 bytes in
+# the packet, a run of 254 bytes without one (COBS's longest block), packets
+# that are cut short or too long, and DELTA packets after a missing one.
+
+import sys
+
+import simulator
+
+simulator.install()
+import usb_cdc
+from display import Display
+from send_frames import cobs_encode
+from stream import DELTA, FULL, MAX_PACKET, StreamMode
+
+def _full(sequence, frame):
+    return cobs_encode(bytes((FULL, sequence)) + bytes(frame)) + b'\0'
+
+def _delta(sequence, *pairs):
+    packet = bytearray((DELTA, sequence))
+    for i, value in pairs:
+        packet += bytes((i, value))
+    return cobs_encode(packet) + b'\0'
+
+def _start():
+    simulator.reset()
+    display = Display()
+    mode = StreamMode(display)
+    mode.start()
+    return display, mode
+
+def _deliver(mode, *packets):
+    # All of packets arrive at once, then draw until they've been read
+    simulator.send(simulator.clock.seconds(), b''.join(packets))
+    while usb_cdc.data.in_waiting:
+        mode.draw()
+    mode.draw()
+
+def _counters(mode):
+    return mode.frames, mode.dropped, mode.replaced, mode.errors
+
+def _expect(mode, display, frame, counters):
+    if bytes(display.frame) != bytes(frame):
+        return 'showing {}, expected {}'.format(list(display.frame), list(frame))
+    if _counters(mode) != counters:
+        return 'frames, dropped, replaced, errors are {}, expected {}'.format(_counters(mode), counters)
+
+def check_full():
+    # Sequence 0 and LED 0 are both 0 bytes
+    display, mode = _start()
+    frame = bytes(i * 5 for i in range(48))
+    _deliver(mode, _full(0, frame))
+    return _expect(mode, display, frame, (1, 0, 0, 0))
+
+def check_embedded_zeros():
+    display, mode = _start()
+    _deliver(mode, _full(0, b'\x07' * 48))
+    # DELTA 1: LED 0 to 0 and LED 5 to 9, COBS encoded by hand
+    packet = bytes((DELTA, 1, 0, 0, 5, 9))
+    encoded = b'\x03\x02\x01\x01\x03\x05\x09'
+    if cobs_encode(packet) != encoded:
+        return 'cobs_encode() gave {}, expected {}'.format(cobs_encode(packet), encoded)
+    _deliver(mode, encoded + b'\0')
+    frame = bytearray(b'\x07' * 48)
+    frame[0] = 0
+    frame[5] = 9
+    return _expect(mode, display, frame, (2, 0, 0, 0))
+
+def check_long_run():
+    # 254 bytes without a 0 take a whole block (code 0xFF) with no 0 after
+    # it. That's longer than any packet, so it's a bad one, but the next
+    # packet still decodes.
+    run = b'\x01' * 254
+    encoded = b'\xff' + run + b'\x01'
+    if cobs_encode(run) != encoded:
+        return 'cobs_encode() gave {}, expected {}'.format(cobs_encode(run), encoded)
+    display, mode = _start()
+    frame = bytes(range(48))
+    _deliver(mode, encoded + b'\0', _full(0, frame))
+    return _expect(mode, display, frame, (1, 0, 0, 1))
+
+def check_too_long():
+    # A DELTA of 60 pairs, with 0 bytes in it, is over MAX_PACKET
+    display, mode = _start()
+    frame = bytes(range(48))
+    _deliver(mode, _full(0, frame))
+    pairs = [(i % 48, 0) for i in range(60)]
+    if 2 + 2 * len(pairs) <= MAX_PACKET:
+        return 'test packet is only {} bytes'.format(2 + 2 * len(pairs))
+    _deliver(mode, _delta(1, *pairs))
+    return _expect(mode, display, frame, (1, 0, 0, 1))
+
+def check_truncated():
+    # The first packet loses its second half, and the 0 byte from the next
+    # one ends it early
+    display, mode = _start()
+    frame = bytes(range(48))
+    cut = _full(0, b'\x09' * 48)[:25]
+    _deliver(mode, cut + b'\0', _full(1, frame))
+    return _expect(mode, display, frame, (1, 0, 0, 1))
+
+def check_gap():
+    # DELTA 3 comes after 2 went missing, so it's ignored until FULL 4
+    display, mode = _start()
+    frame = bytearray(b'\x10' * 48)
+    _deliver(mode, _full(0, frame))
+    _deliver(mode, _delta(1, (1, 20)))
+    frame[1] = 20
+    _deliver(mode, _delta(3, (2, 30)))
+    problem = _expect(mode, display, frame, (2, 1, 0, 0))
+    if problem:
+        return 'after the gap, ' + problem
+
+    frame = bytearray(b'\x40' * 48)
+    _deliver(mode, _full(4, frame))
+    _deliver(mode, _delta(5, (3, 50)))
+    frame[3] = 50
+    return _expect(mode, display, frame, (4, 1, 0, 0))
+
+def check_replaced():
+    # Two frames in one draw: only the newer is shown
+    display, mode = _start()
+    frame = bytes(range(48))
+    _deliver(mode, _full(0, b'\x01' * 48), _full(1, frame))
+    return _expect(mode, display, frame, (1, 0, 1, 0))
+
+CHECKS = (
+    check_full,
+    check_embedded_zeros,
+    check_long_run,
+    check_too_long,
+    check_truncated,
+    check_gap,
+    check_replaced,
+)
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        problem = check()
+        name = check.__name__[len('check_'):]
+        if problem is None:
+            print('{:16} ok'.format(name))
+        else:
+            print('{:16} FAILED: {}'.format(name, problem))
+            failed += 1
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+# Host-side stand-in for CircuitPython's digitalio module.
+# Input pins read the button presses scripted in simulator, or whatever
+# simulator.pin_levels says for pins like the accelerometer interrupt.
+
+import simulator
+
+class Direction:
+    INPUT = 'INPUT'
+    OUTPUT = 'OUTPUT'
+
+class Pull:
+    UP = 'UP'
+    DOWN = 'DOWN'
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.pull = None
+        self.__value = False
+
+    @property
+    def value(self):
+        if self.direction == Direction.OUTPUT:
+            return self.__value
+        level = simulator.pin_levels.get(self.pin.name)
+        if level is not None:
+            return level()
+        # Buttons connect the pin to ground, so a pressed button reads False
+        return not simulator.is_pressed(self.pin.name)
+
+    @value.setter
+    def value(self, value):
+        self.__value = value
+
+    def deinit(self):
+        pass
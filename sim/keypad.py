@@ -0,0 +1,79 @@
+# Host-side stand-in for CircuitPython's keypad module.
+# Keys looks at the scripted button presses once every interval of virtual
+# time, like the real background scanner, so each event is stamped with when
+# the press happened rather than when the code got round to asking.
+
+import simulator
+
+class Event:
+    def __init__(self, key_number=0, pressed=True, timestamp=None):
+        self.key_number = key_number
+        self.pressed = pressed
+        self.timestamp = timestamp
+
+    @property
+    def released(self):
+        return not self.pressed
+
+class EventQueue:
+    def __init__(self, keys, max_events):
+        self.__keys = keys
+        self.__events = []
+        self.max_events = max_events
+        self.overflowed = False
+
+    def _put(self, event):
+        if len(self.__events) >= self.max_events:
+            self.overflowed = True
+            return
+        self.__events.append(event)
+
+    def get_into(self, event):
+        self.__keys._scan()
+        if not self.__events:
+            return False
+        queued = self.__events.pop(0)
+        event.key_number = queued.key_number
+        event.pressed = queued.pressed
+        event.timestamp = queued.timestamp
+        return True
+
+    def get(self):
+        event = Event()
+        if self.get_into(event):
+            return event
+        return None
+
+    def clear(self):
+        del self.__events[:]
+        self.overflowed = False
+
+    def __len__(self):
+        self.__keys._scan()
+        return len(self.__events)
+
+class Keys:
+    def __init__(self, pins, *, value_when_pressed, pull=True, interval=0.02, max_events=64):
+        self.__names = [pin.name for pin in pins]
+        self.key_count = len(pins)
+        self.__interval_ns = int(interval * 1000000000)
+        self.__state = [False] * self.key_count
+        self.__next_scan_ns = simulator.clock.now_ns
+        self.events = EventQueue(self, max_events)
+
+    def _scan(self):
+        now = simulator.clock.now_ns
+        while self.__next_scan_ns <= now:
+            at = self.__next_scan_ns
+            for key, name in enumerate(self.__names):
+                pressed = simulator.is_pressed(name, at)
+                if pressed != self.__state[key]:
+                    self.__state[key] = pressed
+                    self.events._put(Event(key, pressed, simulator.ticks_ms_at(at)))
+            self.__next_scan_ns += self.__interval_ns
+
+    def reset(self):
+        self.__state = [False] * self.key_count
+
+    def deinit(self):
+        pass
@@ -0,0 +1,3 @@
+# Host-side stand-in for CircuitPython's microcontroller module.
+
+nvm = bytearray(256)
@@ -0,0 +1,45 @@
+# Renders the modes that PlaybackMode plays from a table into frames/*.bin.
+# Run from the top of the repository:
+#
+#     python3 sim/render_frames.py
+#
+# then copy the frames directory to the CIRCUITPY drive.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from display import Display
+from mode import BlinkMode, FadeInMode, LOOP1, LOOP2, LOOP3, SWIRL
+from pattern import PatternMode
+import playback
+
+def main():
+    display = Display()
+    modes = [
+        ('blink', BlinkMode(display)),
+        ('fade_in', FadeInMode(display, 0.01)),
+        ('swirl', PatternMode(display, SWIRL)),
+        ('loop1', PatternMode(display, LOOP1)),
+        ('loop2', PatternMode(display, LOOP2)),
+        ('loop3', PatternMode(display, LOOP3)),
+    ]
+
+    if not os.path.isdir(playback.FRAMES_DIR):
+        os.mkdir(playback.FRAMES_DIR)
+
+    for name, mode in modes:
+        warmup = getattr(mode, 'warmup', 0)
+        frames = playback.render(display, mode, mode.period * 2, warmup)
+        if frames[:mode.period] != frames[mode.period:]:
+            print('{} does not repeat every {} frames'.format(name, mode.period))
+            return 1
+        data = playback.encode(frames[:mode.period])
+        with open(playback.frames_path(name), 'wb') as f:
+            f.write(data)
+        print('{}: {} frames, {} bytes'.format(name, mode.period, len(data)))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
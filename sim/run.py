@@ -0,0 +1,34 @@
+# Runs code.py in the simulator and prints where it ended up.
+#
+#     python3 sim/run.py --seconds 30 --press 5:R --press 9:L --accel tilt.csv
+
+import argparse
+
+import simulator
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the snowflake on this computer')
+    parser.add_argument('--seconds', type=float, default=10, help='virtual seconds to run for')
+    parser.add_argument('--press', action='append', default=[], metavar='TIME:L|R',
+                        help='press the left or right button at a virtual time')
+    parser.add_argument('--accel', help='accelerometer trace, one "time, x, y, z" per line')
+    parser.add_argument('--gamma', type=float, help='gamma to apply when printing LED brightness')
+    args = parser.parse_args()
+
+    for spec in args.press:
+        at, side = spec.split(':')
+        simulator.press('MODE_L' if side.upper() == 'L' else 'MODE_R', float(at))
+    if args.accel:
+        simulator.load_accel_trace(args.accel)
+
+    namespace = simulator.run(args.seconds)
+
+    import xmas3
+    xmas3.gamma = args.gamma
+    switcher = namespace['mode_switcher']
+    print('Ran {:.3f} s'.format(simulator.clock.seconds()))
+    print('Mode {}, {}'.format(switcher.mode_group, switcher.mode_index))
+    print('LEDs ' + ' '.join('{:.2f}'.format(xmas3.brightness(i)) for i in range(48)))
+
+if __name__ == '__main__':
+    main()
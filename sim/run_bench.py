@@ -0,0 +1,97 @@
+# Runs bench.py in the simulator and compares it with the stored baseline.
+#
+#     python3 sim/run_bench.py            # print results and differences
+#     python3 sim/run_bench.py --update   # save the results as the new baseline
+#
+# Wall times are from this computer, not the snowflake, so compare them with
+# a baseline from the same machine. Call counts and allocations should match
+# exactly anywhere.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+
+import simulator
+
+BASELINE = os.path.join(simulator.SIM_DIR, 'bench_baseline.json')
+
+# Modes that take about a microsecond go up and down by about that much
+# from run to run, which can be more than double, so slowing down by less
+# than this is never counted as a regression
+NOISE_NS = 1000
+
+def compare(baseline, results, calibration, tolerance):
+    # Times are compared relative to each run's calibration loop
+    scale = calibration / baseline['calibration_ns']
+    baseline = baseline['modes']
+    problems = []
+    for key in sorted(results):
+        new = results[key]
+        old = baseline.get(key)
+        if old is None:
+            problems.append('{} {}: not in baseline'.format(key, new['name']))
+            continue
+        if old['name'] != new['name']:
+            problems.append('{}: was {}, now {}'.format(key, old['name'], new['name']))
+            continue
+        expected = old['time_ns'] * scale
+        if new['time_ns'] > expected * tolerance and new['time_ns'] - expected > NOISE_NS:
+            problems.append('{} {}: time_ns {} -> {}'.format(key, new['name'], old['time_ns'], new['time_ns']))
+        for field in ('set_led', 'get_led', 'alloc'):
+            if new[field] > old[field]:
+                problems.append('{} {}: {} {} -> {}'.format(key, new['name'], field, old[field], new[field]))
+    for key in sorted(baseline):
+        if key not in results:
+            problems.append('{} {}: missing'.format(key, baseline[key]['name']))
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every mode in the simulator')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--bulk', action='store_true',
+                        help='let Display use xmas3.set_leds (the stock firmware does not have it)')
+    parser.add_argument('--tolerance', type=float, default=2.0,
+                        help='how many times slower than the baseline counts as a regression')
+    parser.add_argument('--update', action='store_true', help='write the results to the baseline file')
+    args = parser.parse_args()
+
+    simulator.install()
+    import bench
+    import display
+    from accelerometer import Accelerometer
+
+    if not args.bulk:
+        display._set_leds = None
+
+    # Calibrate before and after the modes and keep the faster, in case the
+    # computer changed speed partway through. Some modes print every frame;
+    # keep that out of the report.
+    with contextlib.redirect_stdout(io.StringIO()):
+        before = bench.calibrate()
+        results = bench.run(display.Display(0, 60), Accelerometer(), args.frames)
+    calibration = min(before, bench.calibrate())
+    bench.report(results)
+    print('calibration loop: {:.1f} ns'.format(calibration))
+
+    if args.update:
+        with open(BASELINE, 'w') as f:
+            json.dump({'calibration_ns': round(calibration, 1), 'modes': results}, f, indent=1, sort_keys=True)
+            f.write('\n')
+        print('Saved ' + BASELINE)
+        return 0
+
+    if not os.path.exists(BASELINE):
+        print('No baseline yet, run with --update to save one')
+        return 0
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    problems = compare(baseline, results, calibration, args.tolerance)
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
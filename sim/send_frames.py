@@ -0,0 +1,165 @@
+# Streams frames to StreamMode (stream.py).
+#
+#     python3 sim/send_frames.py --port /dev/ttyACM1 --fps 200 --seconds 10
+#
+# sends an animation to the snowflake's second serial port (the one boot.py
+# turns on, not the console), which needs pyserial. Pick the stream mode
+# with the buttons first. --frames plays a file of 48-byte frames instead.
+#
+# Without --port it sends to StreamMode running in the simulator instead,
+# then prints what it made of them:
+#
+#     python3 sim/send_frames.py --fps 500 --seconds 5
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulator
+
+# Packet kinds, as in stream.py
+FULL = 1
+DELTA = 2
+
+# Send a whole frame this often even if a DELTA would be shorter, so the
+# snowflake recovers quickly after a lost packet
+KEYFRAME_EVERY = 50
+
+def cobs_encode(data):
+    out = bytearray()
+    block = bytearray()
+    for byte in data:
+        if byte == 0:
+            out.append(len(block) + 1)
+            out += block
+            block = bytearray()
+        else:
+            block.append(byte)
+            if len(block) == 254:
+                out.append(255)
+                out += block
+                block = bytearray()
+    out.append(len(block) + 1)
+    out += block
+    return bytes(out)
+
+class Encoder:
+    def __init__(self, keyframe_every=KEYFRAME_EVERY):
+        self.keyframe_every = keyframe_every
+        self.previous = None
+        self.sequence = 0
+        self.count = 0
+
+    def encode(self, frame):
+        # One frame as a packet, ready to send, 0 byte and all
+        previous = self.previous
+        if previous is None or self.count % self.keyframe_every == 0:
+            changed = None
+        else:
+            changed = [i for i in range(48) if frame[i] != previous[i]]
+            if len(changed) * 2 >= 48:
+                changed = None
+        if changed is None:
+            packet = bytes((FULL, self.sequence)) + bytes(frame)
+        else:
+            packet = bytearray((DELTA, self.sequence))
+            for i in changed:
+                packet += bytes((i, frame[i]))
+        self.previous = bytes(frame)
+        self.sequence = (self.sequence + 1) & 0xFF
+        self.count += 1
+        return cobs_encode(packet) + b'\0'
+
+def spinner(angles, t):
+    # A bright band going round, like the hand of a clock
+    frame = bytearray(48)
+    for i in range(48):
+        wave = math.cos(math.radians(angles[i] - t * 180))
+        frame[i] = max(0, int(255 * wave ** 3)) if wave > 0 else 0
+    return frame
+
+def frame_source(args):
+    # A function from time in seconds to a frame
+    if args.frames:
+        with open(args.frames, 'rb') as f:
+            data = f.read()
+        frames = [data[i:i + 48] for i in range(0, len(data) - 47, 48)]
+        if not frames:
+            raise SystemExit('{} has no whole frames in it'.format(args.frames))
+        return lambda t: frames[int(t * args.fps) % len(frames)]
+
+    simulator.install()
+    from display import Display
+    angles = Display().LED_ANGLE
+    return lambda t: spinner(angles, t)
+
+def send_to_port(args, source):
+    import serial
+    port = serial.Serial(args.port)
+    encoder = Encoder()
+    # Finish off anything half sent before, so the first packet is whole
+    port.write(b'\0')
+    start = time.monotonic()
+    sent = 0
+    total = int(args.seconds * args.fps)
+    for n in range(total):
+        due = start + n / args.fps
+        wait = due - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        data = encoder.encode(source(n / args.fps))
+        port.write(data)
+        sent += len(data)
+    seconds = time.monotonic() - start
+    print('Sent {} frames in {:.1f} s, {:.0f} fps, {:.0f} bytes/s'.format(total, seconds, total / seconds, sent / seconds))
+
+def send_to_simulator(args, source):
+    simulator.install()
+    from display import Display
+    from stream import StreamMode
+
+    display = Display()
+    mode = StreamMode(display)
+    mode.start()
+
+    encoder = Encoder()
+    start = simulator.clock.seconds()
+    total = int(args.seconds * args.fps)
+    for n in range(total):
+        data = encoder.encode(source(n / args.fps))
+        if args.drop_every and n % args.drop_every == args.drop_every - 1:
+            continue
+        simulator.send(start + n / args.fps, data)
+
+    end = start + args.seconds
+    while simulator.clock.seconds() < end:
+        display.dt_us = int(mode.delay * 1000000)
+        mode.draw()
+        display.present()
+        simulator.clock.sleep(mode.delay)
+    mode.report()
+    return mode
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream frames to the snowflake')
+    parser.add_argument('--port', help='serial port of the snowflake (without it, send to the simulator)')
+    parser.add_argument('--fps', type=float, default=100)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--frames', help='file of 48-byte frames to play instead of the spinner')
+    parser.add_argument('--drop-every', type=int, default=0, metavar='N',
+                        help='in the simulator, lose every Nth packet on the way')
+    args = parser.parse_args()
+
+    source = frame_source(args)
+    if args.port:
+        send_to_port(args, source)
+    else:
+        send_to_simulator(args, source)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
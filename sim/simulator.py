@@ -0,0 +1,163 @@
+# Runs the snowflake code on a computer.
+#
+# The other files in this directory stand in for the CircuitPython modules the
+# code imports (alarm, board, digitalio, keypad, microcontroller, supervisor,
+# usb_cdc, xmas3 and adafruit_lis3dh). This module ties them together with a
+# virtual clock, so code.py runs unmodified, as fast as the host allows, and
+# gives the same result every time.
+#
+#     python3 sim/run.py --seconds 30 --press 5:R --press 9:L
+
+import os
+import random
+import sys
+import time as _real_time
+import types
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SIM_DIR)
+
+class SimulationEnd(Exception):
+    pass
+
+class Clock:
+    # Time only moves when the code asks for it. Every read of the clock
+    # costs step_ns, so busy-wait loops still make progress, and sleep()
+    # jumps straight to the end of the sleep.
+    def __init__(self, step_ns=50000):
+        self.now_ns = 0
+        self.step_ns = step_ns
+        self.limit_ns = None
+
+    def advance(self, ns):
+        self.now_ns += ns
+        if self.limit_ns is not None and self.now_ns >= self.limit_ns:
+            raise SimulationEnd()
+
+    def monotonic_ns(self):
+        self.advance(self.step_ns)
+        return self.now_ns
+
+    def monotonic(self):
+        return self.monotonic_ns() / 1000000000
+
+    def sleep(self, seconds):
+        self.advance(int(seconds * 1000000000))
+
+    def seconds(self):
+        return self.now_ns / 1000000000
+
+clock = Clock()
+
+# supervisor.ticks_ms() (and keypad's timestamps) on CircuitPython start
+# about 65 s before they first wrap around at 2^29, rather than at 0, so
+# code that mixes them up with monotonic_ns() or forgets the wrap shows up
+TICKS_OFFSET = 0x1FFF0000
+TICKS_MASK = (1 << 29) - 1
+
+def ticks_ms_at(ns):
+    return (ns // 1000000 + TICKS_OFFSET) & TICKS_MASK
+
+# Button presses, as (pin name, start, end) in seconds
+presses = []
+
+# Accelerometer readings, as (time, (x, y, z)) sorted by time. The reading
+# holds until the next entry. With no trace the snowflake is held upright.
+accel_trace = []
+GRAVITY = (0.0, 9.81, 0.0)
+
+def press(pin_name, at, duration=0.1):
+    presses.append((pin_name, at, at + duration))
+
+# Bytes arriving on usb_cdc.data, as (time, bytes) sorted by time
+serial_data = []
+
+def send(at, data):
+    serial_data.append((at, bytes(data)))
+    if len(serial_data) > 1 and serial_data[-2][0] > at:
+        serial_data.sort(key=lambda item: item[0])
+
+# Pins driven by something other than a button, as name -> function that
+# returns the pin level. The LIS3DH stand-in registers INT1 here.
+pin_levels = {}
+
+def is_pressed(pin_name, at_ns=None):
+    if at_ns is None:
+        at_ns = clock.now_ns
+    now = at_ns / 1000000000
+    for name, start, end in presses:
+        if name == pin_name and start <= now < end:
+            return True
+    return False
+
+def load_accel_trace(path):
+    # One reading per line: time, x, y, z
+    del accel_trace[:]
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            t, x, y, z = (float(v) for v in line.split(','))
+            accel_trace.append((t, (x, y, z)))
+
+def acceleration(at_ns=None):
+    if at_ns is None:
+        at_ns = clock.now_ns
+    now = at_ns / 1000000000
+    value = GRAVITY
+    for t, reading in accel_trace:
+        if t > now:
+            break
+        value = reading
+    return value
+
+def _time_module():
+    # A copy of the time module that reads the virtual clock
+    module = types.ModuleType('time')
+    for name in dir(_real_time):
+        if not name.startswith('__'):
+            setattr(module, name, getattr(_real_time, name))
+    module.monotonic = clock.monotonic
+    module.monotonic_ns = clock.monotonic_ns
+    module.sleep = clock.sleep
+    return module
+
+def install():
+    # Put the stand-in modules ahead of anything else, then the snowflake code
+    for path in (ROOT_DIR, SIM_DIR):
+        if path in sys.path:
+            sys.path.remove(path)
+        sys.path.insert(0, path)
+    sys.modules['time'] = _time_module()
+    # Modes like SparkleMode use random, so seed it to keep runs repeatable
+    random.seed(0)
+
+def reset():
+    clock.now_ns = 0
+    clock.limit_ns = None
+    del presses[:]
+    del serial_data[:]
+    del accel_trace[:]
+    pin_levels.clear()
+
+def run(seconds, path=None):
+    # Runs code.py until the virtual clock reaches seconds, then returns the
+    # globals it left behind (display, mode_switcher and so on).
+    install()
+    if path is None:
+        path = os.path.join(ROOT_DIR, 'code.py')
+    with open(path) as f:
+        code = compile(f.read(), path, 'exec')
+    clock.limit_ns = clock.now_ns + int(seconds * 1000000000)
+    namespace = {'__name__': '__main__', '__file__': path}
+    cwd = os.getcwd()
+    os.chdir(ROOT_DIR)
+    try:
+        exec(code, namespace)
+    except SimulationEnd:
+        pass
+    finally:
+        os.chdir(cwd)
+        clock.limit_ns = None
+    return namespace
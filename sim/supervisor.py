@@ -0,0 +1,18 @@
+# Host-side stand-in for CircuitPython's supervisor module.
+
+import simulator
+
+class Runtime:
+    serial_connected = False
+    serial_bytes_available = 0
+
+runtime = Runtime()
+
+# Like CircuitPython, starts just before it wraps around at 2^29 ms
+def ticks_ms():
+    # A read of the clock, so it moves time on like monotonic_ns() does
+    simulator.clock.advance(simulator.clock.step_ns)
+    return simulator.ticks_ms_at(simulator.clock.now_ns)
+
+def reload():
+    raise simulator.SimulationEnd()
@@ -0,0 +1,41 @@
+# Host-side stand-in for CircuitPython's usb_cdc module.
+# data is the second serial port, fed with bytes from simulator.send(), which
+# only become readable once the virtual clock reaches the time they were sent.
+
+import simulator
+
+class Serial:
+    def __init__(self):
+        self.timeout = 1
+        self.__buffer = bytearray()
+
+    def __arrive(self):
+        incoming = simulator.serial_data
+        now = simulator.clock.seconds()
+        while incoming and incoming[0][0] <= now:
+            self.__buffer += incoming.pop(0)[1]
+
+    @property
+    def in_waiting(self):
+        self.__arrive()
+        return len(self.__buffer)
+
+    def readinto(self, buf, nbytes=None):
+        self.__arrive()
+        count = len(buf) if nbytes is None else min(nbytes, len(buf))
+        count = min(count, len(self.__buffer))
+        if count == 0:
+            return None
+        buf[:count] = self.__buffer[:count]
+        del self.__buffer[:count]
+        return count
+
+    def reset_input_buffer(self):
+        self.__arrive()
+        del self.__buffer[:]
+
+    def write(self, data):
+        return len(data)
+
+console = Serial()
+data = Serial()
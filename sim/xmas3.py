@@ -0,0 +1,34 @@
+# Host-side stand-in for the xmas3 C module that runs on the snowflake.
+
+leds = bytearray(48)
+running = False
+
+# The real driver gamma-corrects in the second core. Set this to see roughly
+# how bright each LED looks, with brightness().
+gamma = None
+
+# How many times each function has been called, for sim/run_bench.py
+calls = {'set_led': 0, 'get_led': 0, 'set_leds': 0}
+
+def start_display(polling_delay_us=None, min_freq=None):
+    global running
+    running = True
+
+def set_led(index, value):
+    calls['set_led'] += 1
+    leds[index] = value
+
+def get_led(index):
+    calls['get_led'] += 1
+    return leds[index]
+
+# Bulk path: copy a whole 48-byte frame in one call
+def set_leds(buffer):
+    calls['set_leds'] += 1
+    leds[:] = buffer
+
+def brightness(index):
+    value = leds[index] / 255
+    if gamma is not None:
+        value = value ** gamma
+    return value
@@ -0,0 +1,81 @@
+# Puts the snowflake to sleep while a mode has nothing more to draw.
+#
+# Modes like ConstantMode draw the same frame every time until a button is
+# pressed. A mode can say so with a class attribute
+#
+#     static = True
+#
+# and once display.present() finds its frame hasn't changed, the main loop
+# stops calling draw() and calls until_input() instead. That light sleeps
+# until a button is pressed or the snowflake is moved. The LEDs keep shining
+# while it sleeps, since xmas3 runs them from the other core.
+#
+# Every wake_every seconds it wakes up anyway to call idle (for the serial
+# console), then goes back to sleep. Settings are saved before it sleeps,
+# since they normally wait for frames to go by first.
+#
+# The scheduler has turned automatic garbage collection off, and only
+# collects between frames, which don't happen while we're here. Every wake up
+# leaves a little behind (the time alarm, new keypad and pin objects), so we
+# collect once per sleep instead, which is nothing next to the sleep itself.
+
+import gc
+import time
+
+import alarm
+
+class Sleeper:
+    def __init__(self, buttons, pins, accel=None, settings=None, wake_every=1.0, motion_threshold=8):
+        # pins are the buttons' pins, in the same order as for Buttons
+        self.buttons = buttons
+        self.pins = pins
+        self.accel = accel
+        self.settings = settings
+        self.wake_every = wake_every
+        self.motion_threshold = motion_threshold
+        # The pin alarms can be used for every sleep, so they're made once.
+        # The last one is the time alarm, which is new every time.
+        self.__alarms = [alarm.pin.PinAlarm(pin, value=False, pull=True) for pin in pins]
+        self.__motion_alarm = None
+        self.__alarms.append(None)
+        # How many times it slept, and for how long altogether
+        self.sleeps = 0
+        self.asleep_ms = 0
+
+    def sleep(self):
+        # Sleep once. Returns True if a button or the accelerometer woke it
+        # (or a button was already busy), False if it was just the time.
+        buttons = self.buttons
+        # Collect anything keypad has seen before letting go of the pins
+        buttons.update()
+        if buttons.busy():
+            return True
+
+        if self.settings is not None:
+            self.settings.flush(True)
+
+        gc.collect()
+        alarms = self.__alarms
+        buttons.stop()
+        if self.accel is not None:
+            motion_pin = self.accel.watch_motion(self.motion_threshold)
+            if self.__motion_alarm is None:
+                self.__motion_alarm = alarm.pin.PinAlarm(motion_pin, value=True)
+                alarms.insert(-1, self.__motion_alarm)
+        start = time.monotonic()
+        alarms[-1] = alarm.time.TimeAlarm(monotonic_time=start + self.wake_every)
+
+        woken_by = alarm.light_sleep_until_alarms(*alarms)
+
+        if self.accel is not None:
+            self.accel.watch_fifo()
+        buttons.start()
+        self.sleeps += 1
+        self.asleep_ms += int((time.monotonic() - start) * 1000)
+        return not isinstance(woken_by, alarm.time.TimeAlarm)
+
+    def until_input(self, idle=None):
+        # Keep sleeping until a button or movement wakes it up
+        while not self.sleep():
+            if idle is not None:
+                idle()
@@ -0,0 +1,177 @@
+# Shows frames sent from a computer over USB, as fast as they arrive.
+# sim/send_frames.py is the sending end.
+#
+# boot.py turns on a second USB serial port (usb_cdc.data) next to the
+# console, so streaming doesn't get mixed up with print() and the REPL.
+#
+# Each frame is one packet, COBS encoded: the packet is rewritten so it has
+# no 0 bytes in it, and a 0 byte marks the end of each one. If bytes go
+# missing only that packet is lost, and the next one starts fresh. Decoded,
+# a packet is:
+# * kind: FULL or DELTA
+# * a sequence number, one more than the last packet's (wrapping at 256),
+#   so we can tell when packets went missing
+# * for FULL, the 48 LED values in xmas3 order
+# * for DELTA, an (index, value) pair for each LED that changed
+# DELTA packets only make sense on top of the frame before, so after a
+# missing packet they're ignored until the next FULL one.
+#
+# Bytes are read with readinto() into a buffer made up front, and decoded
+# into a second frame buffer as they come. When a packet is complete that
+# frame is copied to the display, so nothing is allocated while streaming.
+
+import time
+
+import usb_cdc
+
+FULL = 1
+DELTA = 2
+
+# The longest packet: the header and a DELTA that changes every LED
+MAX_PACKET = 2 + 48 * 2
+
+# Bytes read at a time, and at most how many times per frame, so a flood of
+# data can't hold up the rest of the loop
+CHUNK = 64
+MAX_READS = 8
+
+class StreamMode:
+    def __init__(self, display):
+        self.display = display
+        # Check for new data often, so frames are shown soon after they arrive
+        self.delay = 0.002
+        self.serial = usb_cdc.data
+        self.__chunk = bytearray(CHUNK)
+        self.__packet = bytearray(MAX_PACKET)
+        self.__pending = bytearray(48)
+        self.reset()
+
+    def reset(self):
+        # Frames shown, missing from the sequence, and replaced by a newer
+        # frame before they could be shown
+        self.frames = 0
+        self.dropped = 0
+        self.replaced = 0
+        # Packets that couldn't be decoded
+        self.errors = 0
+        self.bytes = 0
+        self.__started_ns = time.monotonic_ns()
+
+        # Decoding state, see __feed()
+        self.__length = 0
+        self.__remaining = 0
+        self.__zero = False
+        self.__next_sequence = -1
+        # Whether __pending holds a whole frame that DELTA packets can go on
+        self.__synced = False
+        self.__ready = False
+
+    def start(self):
+        self.display.set_all(0)
+        self.reset()
+        if self.serial is None:
+            print('No usb_cdc.data to stream from, see boot.py')
+            return
+        self.serial.timeout = 0
+        # Anything left over from before is stale
+        self.serial.reset_input_buffer()
+
+    def draw(self):
+        serial = self.serial
+        if serial is not None:
+            reads = 0
+            while reads < MAX_READS and serial.in_waiting:
+                count = serial.readinto(self.__chunk)
+                if not count:
+                    break
+                self.bytes += count
+                self.__feed(count)
+                reads += 1
+        if self.__ready:
+            self.display.frame[:] = self.__pending
+            self.__ready = False
+            self.frames += 1
+
+    def __feed(self, count):
+        # COBS decoding, one byte at a time. Each block starts with a code
+        # byte: code - 1 data bytes follow, then a 0 unless the code was 255
+        # or the packet ends there.
+        chunk = self.__chunk
+        packet = self.__packet
+        length = self.__length
+        remaining = self.__remaining
+        zero = self.__zero
+        for k in range(count):
+            byte = chunk[k]
+            if byte == 0:
+                # End of a packet. Empty ones are fine, senders can use them
+                # to make sure we start on a fresh packet.
+                if length > 0 and remaining == 0:
+                    self.__handle(length)
+                elif length > 0:
+                    self.errors += 1
+                length = 0
+                remaining = 0
+                zero = False
+            elif length < 0:
+                # Too long, skip to the next packet
+                continue
+            elif remaining == 0:
+                if zero:
+                    if length == MAX_PACKET:
+                        self.errors += 1
+                        length = -1
+                        continue
+                    packet[length] = 0
+                    length += 1
+                remaining = byte - 1
+                zero = byte < 0xFF
+            else:
+                if length == MAX_PACKET:
+                    self.errors += 1
+                    length = -1
+                    continue
+                packet[length] = byte
+                length += 1
+                remaining -= 1
+        self.__length = length
+        self.__remaining = remaining
+        self.__zero = zero
+
+    def __handle(self, length):
+        packet = self.__packet
+        kind = packet[0]
+        if length < 2 or not (kind == FULL and length == 2 + 48 or kind == DELTA and length % 2 == 0):
+            self.errors += 1
+            return
+
+        sequence = packet[1]
+        if self.__next_sequence >= 0 and sequence != self.__next_sequence:
+            self.dropped += (sequence - self.__next_sequence) & 0xFF
+            self.__synced = False
+        self.__next_sequence = (sequence + 1) & 0xFF
+
+        pending = self.__pending
+        if kind == FULL:
+            for i in range(48):
+                pending[i] = packet[i + 2]
+            self.__synced = True
+        else:
+            if not self.__synced:
+                return
+            for j in range(2, length, 2):
+                i = packet[j]
+                if i < 48:
+                    pending[i] = packet[j + 1]
+
+        if self.__ready:
+            self.replaced += 1
+        self.__ready = True
+
+    def report(self):
+        # Called by Telemetry.dump()
+        seconds = (time.monotonic_ns() - self.__started_ns) / 1000000000
+        if seconds <= 0:
+            seconds = 1
+        print('Stream: {} frames at {:.1f} fps, {} bytes/s, {} dropped, {} replaced, {} bad packets'.format(
+            self.frames, self.frames / seconds, int(self.bytes / seconds), self.dropped, self.replaced, self.errors))
@@ -0,0 +1,128 @@
+import gc
+import sys
+
+import supervisor
+
+# Times are sorted into buckets by powers of two microseconds: bucket 0 is
+# under 1 us, bucket 1 under 2 us, bucket 2 under 4 us and so on. The last
+# bucket holds everything from about 16 ms up.
+BUCKETS = 16
+
+# gc.mem_free() has to scan the heap, so only check it every few frames
+MEM_CHECK_FRAMES = 16
+
+def mode_name(mode):
+    name = type(mode).__name__
+    wrapped = getattr(mode, 'name', None)
+    if isinstance(wrapped, str):
+        name += ' ' + wrapped
+    return name
+
+def _bucket(ns):
+    us = ns // 1000
+    bucket = 0
+    while us and bucket < BUCKETS - 1:
+        us >>= 1
+        bucket += 1
+    return bucket
+
+class ModeStats:
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.overruns = 0
+        self.max_draw_us = 0
+        self.draw = [0] * BUCKETS
+        self.slack = [0] * BUCKETS
+        # Total time between frames, to work out the frame rate it managed
+        self.seconds = 0
+        self.us = 0
+
+    def fps(self):
+        total = self.seconds + self.us / 1000000
+        if total == 0:
+            return 0
+        return self.frames / total
+
+class Telemetry:
+    # Records how long each mode takes to draw and how much of its delay is
+    # left over. Stats are kept by mode name, since ModeSwitcher makes a new
+    # mode object each time one is picked. Everything is allocated when the
+    # mode changes, so recording a frame doesn't allocate.
+    #
+    # Type t and press enter in the serial console to print the stats, or r
+    # to reset them.
+    def __init__(self):
+        self.modes = {}
+        self.mem_free_low = None
+        self.__countdown = 0
+        self.__mode = None
+        self.__stats = None
+
+    def record(self, mode, draw_ns, slack_ns, frame_ns=0):
+        stats = self.__stats
+        if mode is not self.__mode or stats is None:
+            name = mode_name(mode)
+            stats = self.modes.get(name)
+            if stats is None:
+                stats = ModeStats(name)
+                self.modes[name] = stats
+            self.__mode = mode
+            self.__stats = stats
+
+        stats.frames += 1
+        stats.draw[_bucket(draw_ns)] += 1
+        draw_us = draw_ns // 1000
+        if draw_us > stats.max_draw_us:
+            stats.max_draw_us = draw_us
+        if slack_ns < 0:
+            stats.overruns += 1
+        else:
+            stats.slack[_bucket(slack_ns)] += 1
+        stats.us += frame_ns // 1000
+        while stats.us >= 1000000:
+            stats.us -= 1000000
+            stats.seconds += 1
+
+        self.__countdown -= 1
+        if self.__countdown <= 0:
+            self.__countdown = MEM_CHECK_FRAMES
+            self.check_memory()
+
+    def check_memory(self):
+        # CPython (the simulator) doesn't have gc.mem_free()
+        mem_free = getattr(gc, 'mem_free', None)
+        if mem_free is None:
+            return
+        free = mem_free()
+        if self.mem_free_low is None or free < self.mem_free_low:
+            self.mem_free_low = free
+
+    def reset(self):
+        self.modes = {}
+        self.mem_free_low = None
+        self.__stats = None
+
+    def poll_serial(self):
+        runtime = supervisor.runtime
+        if runtime is None or not runtime.serial_bytes_available:
+            return
+        command = sys.stdin.read(1)
+        if command == 't':
+            self.dump()
+        elif command == 'r':
+            self.reset()
+            print('Telemetry reset')
+
+    def dump(self):
+        print('Lowest free memory: {}'.format(self.mem_free_low))
+        print('Buckets are powers of two microseconds: <1, <2, <4, ... >={}'.format(1 << (BUCKETS - 2)))
+        for stats in self.modes.values():
+            print('{}: {} frames at {:.1f} fps, {} overruns, slowest {} us'.format(
+                stats.name, stats.frames, stats.fps(), stats.overruns, stats.max_draw_us))
+            print('  draw  ' + ' '.join(str(n) for n in stats.draw))
+            print('  slack ' + ' '.join(str(n) for n in stats.slack))
+        # Modes can have a report() with numbers of their own
+        report = getattr(self.__mode, 'report', None)
+        if report is not None:
+            report()